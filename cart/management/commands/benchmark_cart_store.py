@@ -0,0 +1,86 @@
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from products.models import Product
+from cart.models import Cart
+from cart.store import CART_STORES
+
+BENCHMARK_USERNAME = 'cart-store-benchmark'
+
+
+def run_operations(store, carts, product_ids, operations):
+    """
+    Run ``operations`` item changes on each cart, each one read and written
+    back the way add_item does, followed by a read of the cart.
+    """
+    for cart in carts:
+        for i in range(operations):
+            product_id = product_ids[i % len(product_ids)]
+            quantities = store.get_quantities(cart)
+            store.set_quantities(cart, {product_id: quantities.get(product_id, 0) + 1})
+            store.get_quantities(cart)
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure cart operations per second for each cart store on temporary '
+        'carts holding existing products'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--carts', type=int, default=100)
+        parser.add_argument('--operations', type=int, default=20, help='Item changes per cart')
+        parser.add_argument('--products', type=int, default=10, help='Distinct products per cart')
+        parser.add_argument('--stores', nargs='+', choices=sorted(CART_STORES), default=sorted(CART_STORES))
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True)[:options['products']])
+        if not product_ids:
+            raise CommandError('There are no products to put in the carts')
+
+        # The carts, their items and their rows go with the user
+        user, _ = get_user_model().objects.get_or_create(
+            username=BENCHMARK_USERNAME, defaults={'email': f'{BENCHMARK_USERNAME}@example.com'}
+        )
+        try:
+            for name in options['stores']:
+                self.benchmark(name, user, product_ids, options)
+        finally:
+            user.delete()
+
+    def benchmark(self, name, user, product_ids, options):
+        store = CART_STORES[name]()
+        if store.keeps_items:
+            try:
+                store.client.ping()
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f'{name}: skipped, no Redis connection ({e})'))
+                return
+
+        carts = Cart.objects.bulk_create([Cart(user=user) for _ in range(options['carts'])])
+        # Primary keys are not returned by bulk_create on every backend
+        carts = list(Cart.objects.filter(user=user).order_by('pk'))
+        try:
+            # A change and a read per operation
+            count = len(carts) * options['operations'] * 2
+            start = time.perf_counter()
+            run_operations(store, carts, product_ids, options['operations'])
+            elapsed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            persisted = store.persist_dirty_carts()
+            persist_elapsed = time.perf_counter() - start
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f'{name}: {e}'))
+            return
+        finally:
+            for cart in carts:
+                store.clear(cart)
+            Cart.objects.filter(user=user).delete()
+
+        self.stdout.write(
+            f'{name}: {count} cart operations on {len(carts)} carts in {elapsed:.2f}s: '
+            f'{count / elapsed:,.0f} ops/s'
+        )
+        if persisted:
+            self.stdout.write(f'{name}: wrote {persisted} carts back to the database in {persist_elapsed:.2f}s')
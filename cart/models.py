@@ -17,29 +17,24 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart for {self.user.email}"
 
+    @property
+    def totals(self):
+        if not hasattr(self, '_totals'):
+            from .pricing import price_carts
+            price_carts([self])
+        return self._totals
+
     @property
     def total_items(self):
-        return self.items.count()
+        return self.totals.total_items
 
     @property
     def subtotal(self):
-        return sum(item.subtotal for item in self.items.all())
+        return self.totals.subtotal
 
     @property
     def total(self):
-        subtotal = self.subtotal
-        if not self.discount or not self.discount.is_valid:
-            return subtotal
-
-        if self.discount.discount_type == 'percentage':
-            discount_amount = subtotal * (self.discount.amount / 100)
-        else:
-            discount_amount = self.discount.amount
-
-        if self.discount.max_discount_amount:
-            discount_amount = min(discount_amount, self.discount.max_discount_amount)
-
-        return max(subtotal - discount_amount, 0)
+        return self.totals.total
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
@@ -59,3 +54,19 @@ class CartItem(models.Model):
     @property
     def subtotal(self):
         return self.quantity * self.product.price
+
+class StockReservation(models.Model):
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('stock reservation')
+        verbose_name_plural = _('stock reservations')
+        unique_together = ('cart', 'product')
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name} held for cart {self.cart_id}"
@@ -0,0 +1,62 @@
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+from products.models import Discount
+from .models import Cart, CartItem
+
+CartTotals = namedtuple('CartTotals', ('total_items', 'subtotal', 'discount_amount', 'total'))
+
+ZERO = Decimal('0.00')
+
+
+def get_cart_totals(total_items, subtotal, discount):
+    discount_amount = ZERO
+    if discount and discount.is_valid:
+        discount_amount = min(discount.get_discount_amount(subtotal), subtotal)
+    return CartTotals(total_items, subtotal, discount_amount, subtotal - discount_amount)
+
+
+def price_carts(carts):
+    """
+    Compute item count, subtotal, discount and total for the given carts and
+    memoize the result on each instance.
+
+    Carts whose items were prefetched are priced from memory; the rest share
+    a single query over their items.
+    """
+    carts = [cart for cart in carts if not hasattr(cart, '_totals')]
+    if not carts:
+        return
+
+    # Load discounts that were not select_related in one query
+    missing_discounts = {
+        cart.discount_id for cart in carts
+        if cart.discount_id and not Cart.discount.is_cached(cart)
+    }
+    if missing_discounts:
+        discounts = Discount.objects.in_bulk(missing_discounts)
+        for cart in carts:
+            if cart.discount_id in discounts:
+                cart.discount = discounts[cart.discount_id]
+
+    pending = []
+    for cart in carts:
+        items = getattr(cart, '_prefetched_objects_cache', {}).get('items')
+        if items is None:
+            pending.append(cart)
+            continue
+        subtotal = sum((item.subtotal for item in items), ZERO)
+        cart._totals = get_cart_totals(len(items), subtotal, cart.discount)
+
+    if not pending:
+        return
+
+    # djongo can only SUM a single column, so each line is read once and
+    # the carts are totalled here
+    total_items = defaultdict(int)
+    subtotals = defaultdict(lambda: ZERO)
+    rows = CartItem.objects.filter(cart__in=pending).values_list('cart_id', 'quantity', 'product__price')
+    for cart_id, quantity, price in rows:
+        total_items[cart_id] += 1
+        subtotals[cart_id] += quantity * price
+    for cart in pending:
+        cart._totals = get_cart_totals(total_items[cart.pk], subtotals[cart.pk], cart.discount)
@@ -0,0 +1,134 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from products.inventory import InsufficientStock, decrement_stock, restock
+from .models import StockReservation
+
+
+def get_reservation_expiry():
+    minutes = getattr(settings, 'CART_RESERVATION_MINUTES', 30)
+    return timezone.now() + timedelta(minutes=minutes)
+
+
+def reserve_stock(cart, quantities):
+    """
+    Make ``cart`` hold exactly ``{product_id: quantity}`` for each given
+    product, taking or returning only the difference from what it already
+    holds. A quantity of 0 drops the reservation.
+
+    Raises ``InsufficientStock`` with the total quantity the cart could hold
+    for each failing product, and ``ValueError`` for a negative quantity.
+    Every reservation on the cart is extended.
+    """
+    negative = sorted(product_id for product_id, quantity in quantities.items() if quantity < 0)
+    if negative:
+        raise ValueError(f'Negative quantities for products {negative}')
+
+    with transaction.atomic():
+        held = dict(
+            StockReservation.objects
+            .select_for_update()
+            .filter(cart=cart, product_id__in=quantities)
+            .values_list('product_id', 'quantity')
+        )
+
+        to_take = {}
+        to_return = {}
+        for product_id, quantity in quantities.items():
+            delta = quantity - held.get(product_id, 0)
+            if delta > 0:
+                to_take[product_id] = delta
+            elif delta < 0:
+                to_return[product_id] = -delta
+
+        try:
+            decrement_stock(to_take)
+        except InsufficientStock as exc:
+            raise InsufficientStock({
+                product_id: available + held.get(product_id, 0)
+                for product_id, available in exc.shortages.items()
+            })
+        restock(to_return)
+
+        expires_at = get_reservation_expiry()
+        StockReservation.objects.filter(cart=cart, product_id__in=held).delete()
+        StockReservation.objects.bulk_create([
+            StockReservation(cart=cart, product_id=product_id, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in quantities.items()
+            if quantity > 0
+        ])
+        StockReservation.objects.filter(cart=cart).update(expires_at=expires_at)
+
+
+def release_reservations(cart, product_ids=None):
+    """
+    Return the stock held by ``cart`` (optionally only for ``product_ids``).
+    """
+    with transaction.atomic():
+        reservations = StockReservation.objects.select_for_update().filter(cart=cart)
+        if product_ids is not None:
+            reservations = reservations.filter(product_id__in=product_ids)
+        held = dict(reservations.values_list('product_id', 'quantity'))
+        if not held:
+            return
+
+        StockReservation.objects.filter(cart=cart, product_id__in=held).delete()
+        restock(held)
+
+
+def consume_reservations(cart, quantities):
+    """
+    Turn the stock held by ``cart`` into a sale of ``{product_id: quantity}``.
+
+    Returns the quantities the reservations did not cover, which the caller
+    still has to take from stock. Must run inside the checkout transaction
+    so a failed checkout puts the reservations back.
+    """
+    held = dict(
+        StockReservation.objects
+        .select_for_update()
+        .filter(cart=cart, product_id__in=quantities)
+        .values_list('product_id', 'quantity')
+    )
+
+    remaining = {}
+    leftovers = {}
+    for product_id, quantity in quantities.items():
+        covered = min(held.get(product_id, 0), quantity)
+        if quantity > covered:
+            remaining[product_id] = quantity - covered
+        if held.get(product_id, 0) > covered:
+            leftovers[product_id] = held[product_id] - covered
+
+    StockReservation.objects.filter(cart=cart, product_id__in=held).delete()
+    restock(leftovers)
+    return remaining
+
+
+def release_expired_reservations(batch_size=500):
+    """
+    Return stock held by expired reservations, in batches. Rows locked by a
+    concurrent checkout are skipped and picked up on the next run.
+    """
+    now = timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            expired = list(
+                StockReservation.objects
+                .select_for_update(skip_locked=True)
+                .filter(expires_at__lte=now)
+                .values_list('pk', 'product_id', 'quantity')[:batch_size]
+            )
+            if not expired:
+                break
+
+            quantities = defaultdict(int)
+            for _, product_id, quantity in expired:
+                quantities[product_id] += quantity
+            StockReservation.objects.filter(pk__in=[pk for pk, _, _ in expired]).delete()
+            restock(quantities)
+        released += len(expired)
+    return released
@@ -1,9 +1,18 @@
+from django.db import models
+from django.utils.functional import cached_property
 from rest_framework import serializers
+from ecommerce.serializers import EagerLoadingMixin, ReadOnlySerializer, is_expanded, wants_field
 from .models import Cart, CartItem
-from products.serializers import ProductSerializer
+from .pricing import price_carts
+from .store import get_cart_store
+from products.serializers import ProductReadSerializer, ProductSerializer
 from products.models import Product, Discount
+from products.cache import get_discount
+
+class CartItemSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ('product__category',)
+    prefetch_related_fields = ('product__images',)
 
-class CartItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(),
@@ -31,7 +40,20 @@ class CartItemSerializer(serializers.ModelSerializer):
 
         return attrs
 
-class CartSerializer(serializers.ModelSerializer):
+class CartListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        carts = list(data.all() if isinstance(data, models.Manager) else data)
+        fields = getattr(self.child, 'fields_filter', None)
+        if wants_field(fields, 'items') or wants_field(fields, 'subtotal') or wants_field(fields, 'total'):
+            get_cart_store().attach_items(carts)
+        if wants_field(fields, 'subtotal') or wants_field(fields, 'total'):
+            price_carts(carts)
+        return super().to_representation(carts)
+
+class CartSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ('discount',)
+    prefetch_related_fields = ('items__product__category', 'items__product__images')
+
     items = CartItemSerializer(many=True, read_only=True)
     discount_code = serializers.CharField(write_only=True, required=False)
     subtotal = serializers.DecimalField(
@@ -48,12 +70,72 @@ class CartSerializer(serializers.ModelSerializer):
     class Meta:
         model = Cart
         fields = ('id', 'items', 'discount_code', 'subtotal', 'total', 'created_at', 'updated_at')
+        list_serializer_class = CartListSerializer
 
     def validate_discount_code(self, value):
         try:
-            discount = Discount.objects.get(code=value)
+            discount = get_discount(value)
             if not discount.is_valid:
                 raise serializers.ValidationError('This discount code is not valid.')
-            return value
+            return discount
         except Discount.DoesNotExist:
-            raise serializers.ValidationError('Invalid discount code.') 
\ No newline at end of file
+            raise serializers.ValidationError('Invalid discount code.')
+
+    def validate(self, attrs):
+        # The code was resolved to its Discount while validating the field
+        if 'discount_code' in attrs:
+            attrs['discount'] = attrs.pop('discount_code')
+        return attrs 
+
+class CartReadSerializer(ReadOnlySerializer):
+    """
+    Fast read-only equivalent of ``CartSerializer`` for every response that
+    returns a cart. Item products collapse to their id when ``product`` is
+    not expanded.
+    """
+    field_names = ('id', 'items', 'subtotal', 'total', 'created_at', 'updated_at')
+    money_fields = ('subtotal', 'total')
+    datetime_fields = ('created_at', 'updated_at')
+
+    class Meta:
+        list_serializer_class = CartListSerializer
+
+    @classmethod
+    def get_related_lookups(cls, fields=None, expand=None, prefix=''):
+        select, prefetch = [], []
+        if wants_field(fields, 'subtotal') or wants_field(fields, 'total'):
+            select.append('discount')
+        if wants_field(fields, 'items'):
+            # Item subtotals need the product price even when collapsed
+            prefetch.append('items__product')
+            if is_expanded(expand, 'product'):
+                prefetch += ProductReadSerializer.get_related_lookups(
+                    expand=expand, prefix='items__product__'
+                )[1]
+        return select, prefetch
+
+    @cached_property
+    def product_serializer(self):
+        return ProductReadSerializer(context=self.context, expand=self.expand)
+
+    def to_representation(self, cart):
+        # A no-op when the list serializer already attached the whole page
+        fields = self.fields_filter
+        if wants_field(fields, 'items') or wants_field(fields, 'subtotal') or wants_field(fields, 'total'):
+            get_cart_store().attach_items([cart])
+        return super().to_representation(cart)
+
+    def get_items(self, cart):
+        expanded = self.is_expanded('product')
+        return [
+            {
+                'id': item.id,
+                'product': (
+                    self.product_serializer.to_representation(item.product)
+                    if expanded else item.product_id
+                ),
+                'quantity': item.quantity,
+                'subtotal': self.format_money(item.subtotal),
+            }
+            for item in cart.items.all()
+        ]
@@ -0,0 +1,250 @@
+"""
+Cart item storage.
+
+``DatabaseCartStore`` keeps cart items as CartItem rows. ``RedisCartStore``
+keeps the items of live carts in a Redis hash of product id to quantity and
+writes them back to CartItem rows in ``persist_dirty_carts`` (run by Celery
+beat) or when a cart is persisted explicitly. A hash expires after
+CART_STORE_TIMEOUT seconds without activity, and the cart is reloaded from
+its rows the next time it is used. Select the backend with CART_STORE.
+
+The Cart row and its stock reservations stay in the database with either
+backend.
+"""
+from functools import lru_cache
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+from products.models import Product
+from .models import Cart, CartItem
+
+CART_STORE_TIMEOUT = 60 * 60 * 48
+DIRTY_CARTS_KEY = 'cart_store:dirty'
+# Present in every loaded hash so an empty cart is told apart from an
+# expired one
+LOADED_FIELD = b'_'
+
+
+def set_prefetched_items(cart, items):
+    """
+    Install ``items`` as the result of ``cart.items.all()``, the same way
+    prefetch_related stores its results.
+    """
+    queryset = CartItem.objects.filter(cart=cart)
+    queryset._result_cache = items
+    queryset._prefetch_done = True
+    if not hasattr(cart, '_prefetched_objects_cache'):
+        cart._prefetched_objects_cache = {}
+    cart._prefetched_objects_cache['items'] = queryset
+
+
+class DatabaseCartStore:
+    # Items live in CartItem rows, so querysets can prefetch them
+    keeps_items = False
+
+    def get_quantities(self, cart):
+        return dict(CartItem.objects.filter(cart=cart).values_list('product_id', 'quantity'))
+
+    def set_quantities(self, cart, quantities):
+        """
+        Set ``{product_id: quantity}`` on the cart with bulk writes, where a
+        quantity of 0 removes the item.
+        """
+        self.write_items(cart.pk, quantities)
+
+    def replace(self, cart_id, quantities):
+        """Make the cart's rows match ``quantities`` exactly."""
+        current = CartItem.objects.filter(cart_id=cart_id).values_list('product_id', flat=True)
+        removed = {product_id: 0 for product_id in current if product_id not in quantities}
+        self.write_items(cart_id, {**removed, **quantities})
+
+    def write_items(self, cart_id, quantities):
+        with transaction.atomic():
+            cart_items = {
+                item.product_id: item
+                for item in CartItem.objects.filter(cart_id=cart_id, product_id__in=quantities)
+            }
+
+            now = timezone.now()
+            to_create = []
+            to_update = []
+            to_delete = []
+            for product_id, quantity in quantities.items():
+                cart_item = cart_items.get(product_id)
+                if cart_item is None:
+                    if quantity > 0:
+                        to_create.append(CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity))
+                elif quantity == 0:
+                    to_delete.append(cart_item.pk)
+                elif quantity != cart_item.quantity:
+                    cart_item.quantity = quantity
+                    cart_item.updated_at = now
+                    to_update.append(cart_item)
+
+            CartItem.objects.bulk_create(to_create)
+            CartItem.objects.bulk_update(to_update, ['quantity', 'updated_at'])
+            CartItem.objects.filter(pk__in=to_delete).delete()
+
+    def clear(self, cart):
+        CartItem.objects.filter(cart=cart).delete()
+
+    def attach_items(self, carts):
+        pass
+
+    def persist(self, cart):
+        pass
+
+    def persist_dirty_carts(self, batch_size=500):
+        return 0
+
+
+class RedisCartStore:
+    # Items live in Redis, so querysets must not prefetch the stale rows
+    keeps_items = True
+
+    def __init__(self):
+        self.database = DatabaseCartStore()
+        self.timeout = getattr(settings, 'CART_STORE_TIMEOUT', CART_STORE_TIMEOUT)
+
+    @cached_property
+    def client(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+
+    def get_key(self, cart_id):
+        return f'cart_store:{cart_id}'
+
+    def decode(self, values):
+        return {int(field): int(value) for field, value in values.items() if field != LOADED_FIELD}
+
+    def load(self, cart_ids):
+        """
+        Return ``{cart_id: {product_id: quantity}}``, filling expired or
+        never loaded carts from their rows with one query.
+        """
+        pipeline = self.client.pipeline()
+        for cart_id in cart_ids:
+            pipeline.hgetall(self.get_key(cart_id))
+        loaded = dict(zip(cart_ids, pipeline.execute()))
+
+        quantities = {cart_id: self.decode(values) for cart_id, values in loaded.items() if values}
+        missing = [cart_id for cart_id, values in loaded.items() if not values]
+        if missing:
+            for cart_id in missing:
+                quantities[cart_id] = {}
+            rows = CartItem.objects.filter(cart_id__in=missing).values_list('cart_id', 'product_id', 'quantity')
+            for cart_id, product_id, quantity in rows:
+                quantities[cart_id][product_id] = quantity
+
+            pipeline = self.client.pipeline()
+            for cart_id in missing:
+                key = self.get_key(cart_id)
+                pipeline.hset(key, mapping={LOADED_FIELD: 1, **quantities[cart_id]})
+                pipeline.expire(key, self.timeout)
+            pipeline.execute()
+        return quantities
+
+    def get_quantities(self, cart):
+        return self.load([cart.pk])[cart.pk]
+
+    def set_quantities(self, cart, quantities):
+        # Load first so a partial write never lands in an expired hash
+        self.get_quantities(cart)
+
+        key = self.get_key(cart.pk)
+        pipeline = self.client.pipeline()
+        kept = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+        removed = [product_id for product_id, quantity in quantities.items() if quantity <= 0]
+        if kept:
+            pipeline.hset(key, mapping=kept)
+        if removed:
+            pipeline.hdel(key, *removed)
+        pipeline.expire(key, self.timeout)
+        pipeline.sadd(DIRTY_CARTS_KEY, cart.pk)
+        pipeline.execute()
+
+    def clear(self, cart):
+        pipeline = self.client.pipeline()
+        pipeline.delete(self.get_key(cart.pk))
+        pipeline.srem(DIRTY_CARTS_KEY, cart.pk)
+        pipeline.execute()
+        self.database.clear(cart)
+
+    def attach_items(self, carts):
+        """
+        Build the items of ``carts`` from Redis, loading their products in
+        one query. Items not yet persisted have no primary key.
+        """
+        carts = [cart for cart in carts if 'items' not in getattr(cart, '_prefetched_objects_cache', {})]
+        if not carts:
+            return
+
+        quantities = self.load([cart.pk for cart in carts])
+        product_ids = {product_id for items in quantities.values() for product_id in items}
+        products = (
+            Product.objects
+            .select_related('category')
+            .prefetch_related('images')
+            .in_bulk(product_ids)
+        )
+        persisted = {
+            (cart_id, product_id): pk
+            for pk, cart_id, product_id in CartItem.objects.filter(
+                cart__in=carts
+            ).values_list('pk', 'cart_id', 'product_id')
+        }
+
+        for cart in carts:
+            set_prefetched_items(cart, [
+                CartItem(
+                    pk=persisted.get((cart.pk, product_id)),
+                    cart=cart,
+                    product=products[product_id],
+                    quantity=quantity
+                )
+                for product_id, quantity in quantities[cart.pk].items()
+                if product_id in products
+            ])
+
+    def persist(self, cart):
+        self.client.srem(DIRTY_CARTS_KEY, cart.pk)
+        self.database.replace(cart.pk, self.get_quantities(cart))
+
+    def persist_dirty_carts(self, batch_size=500):
+        """
+        Write every cart changed since the last run back to its rows.
+        Returns the number of carts written.
+        """
+        persisted = 0
+        while True:
+            cart_ids = [int(cart_id) for cart_id in self.client.spop(DIRTY_CARTS_KEY, batch_size) or []]
+            if not cart_ids:
+                return persisted
+
+            pipeline = self.client.pipeline()
+            for cart_id in cart_ids:
+                pipeline.hgetall(self.get_key(cart_id))
+            loaded = dict(zip(cart_ids, pipeline.execute()))
+
+            existing = set(Cart.objects.filter(pk__in=cart_ids).values_list('pk', flat=True))
+            for cart_id, values in loaded.items():
+                # Cleared or deleted carts have nothing left to write
+                if values and cart_id in existing:
+                    self.database.replace(cart_id, self.decode(values))
+                    persisted += 1
+
+
+CART_STORES = {
+    'database': DatabaseCartStore,
+    'redis': RedisCartStore,
+}
+
+
+@lru_cache(maxsize=None)
+def _get_cart_store(name):
+    return CART_STORES[name]()
+
+
+def get_cart_store():
+    return _get_cart_store(getattr(settings, 'CART_STORE', 'database'))
@@ -0,0 +1,25 @@
+from celery import shared_task
+from .reservations import release_expired_reservations
+from .store import get_cart_store
+
+@shared_task
+def release_expired_stock_reservations():
+    """
+    Return stock held by carts whose reservations have expired
+    """
+    try:
+        return release_expired_reservations()
+    except Exception as e:
+        print(f"Error releasing expired stock reservations: {str(e)}")
+        return 0
+
+@shared_task
+def persist_cart_store():
+    """
+    Write carts changed in the cart store back to the database
+    """
+    try:
+        return get_cart_store().persist_dirty_carts()
+    except Exception as e:
+        print(f"Error persisting cart store: {str(e)}")
+        return 0
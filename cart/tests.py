@@ -1,3 +1,193 @@
-from django.test import TestCase
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from orders.views import OrderViewSet
+from products.tests import LOCMEM_CACHES, create_catalogue, get_serializer_context, render
+from .models import Cart, CartItem, StockReservation
+from .reservations import release_expired_reservations
+from .serializers import CartReadSerializer, CartSerializer
+from .views import CartViewSet
 
-# Create your tests here.
+
+@override_settings(CACHES=LOCMEM_CACHES, CART_STORE='database')
+class CartQueryCountTests(TestCase):
+    """Related rows are batched, so the query count does not grow with the cart."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            email='shopper@example.com', username='shopper', password='password'
+        )
+        products = create_catalogue()
+        cls.carts = []
+        for _ in range(3):
+            cart = Cart.objects.create(user=cls.user)
+            for product in products:
+                CartItem.objects.create(cart=cart, product=product, quantity=2)
+            cls.carts.append(cart)
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+
+    def get(self, actions, url, **kwargs):
+        request = self.factory.get(url)
+        force_authenticate(request, user=self.user)
+        return CartViewSet.as_view(actions)(request, **kwargs)
+
+    def test_list(self):
+        # Page count, carts with their discounts, then items, products,
+        # categories and images. Totals come from the prefetched items
+        with self.assertNumQueries(6):
+            response = self.get({'get': 'list'}, '/api/carts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), len(self.carts))
+
+    def test_retrieve(self):
+        cart = self.carts[0]
+        with self.assertNumQueries(5):
+            response = self.get({'get': 'retrieve'}, f'/api/carts/{cart.pk}/', pk=cart.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['items']), 5)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, CART_STORE='database')
+class CartReadSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(
+            email='shopper@example.com', username='shopper', password='password'
+        )
+        cart = Cart.objects.create(user=user)
+        for product in create_catalogue():
+            CartItem.objects.create(cart=cart, product=product, quantity=3)
+
+    def test_matches_model_serializer(self):
+        carts = CartSerializer.setup_eager_loading(Cart.objects.order_by('pk'))
+        context = get_serializer_context()
+        self.assertEqual(
+            render(CartReadSerializer(carts, many=True, context=context).data),
+            render(CartSerializer(carts, many=True, context=context).data)
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES, CART_STORE='database')
+class StockReservationTests(TestCase):
+    """Cart items hold stock until the cart is cleared, expires or checks out."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            email='shopper@example.com', username='shopper', password='password'
+        )
+        cls.product, cls.other = create_catalogue(2)
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.cart = Cart.objects.create(user=self.user)
+
+    def post(self, viewset, action, url, data, **kwargs):
+        request = self.factory.post(url, data, format='json')
+        force_authenticate(request, user=self.user)
+        return viewset.as_view({'post': action})(request, **kwargs)
+
+    def post_to_cart(self, action, data):
+        return self.post(CartViewSet, action, f'/api/carts/{self.cart.pk}/{action}/', data, pk=self.cart.pk)
+
+    def add_item(self, product, quantity):
+        return self.post_to_cart('add_item', {'product_id': product.pk, 'quantity': quantity})
+
+    def assertStock(self, product, stock):
+        product.refresh_from_db()
+        self.assertEqual(product.stock, stock)
+
+    def assertHeld(self, held):
+        self.assertEqual(
+            dict(StockReservation.objects.filter(cart=self.cart).values_list('product_id', 'quantity')),
+            held
+        )
+
+    def test_add_item_holds_stock(self):
+        self.assertEqual(self.add_item(self.product, 3).status_code, 200)
+        self.assertEqual(self.add_item(self.product, 2).status_code, 200)
+        self.assertStock(self.product, 5)
+        self.assertHeld({self.product.pk: 5})
+
+    def test_over_reservation_is_refused(self):
+        self.add_item(self.product, 4)
+        response = self.add_item(self.product, 7)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Only 10 items available in stock')
+        self.assertStock(self.product, 6)
+        self.assertHeld({self.product.pk: 4})
+        self.assertEqual(CartItem.objects.get(cart=self.cart).quantity, 4)
+
+    def test_clear_releases_stock(self):
+        self.add_item(self.product, 4)
+        self.add_item(self.other, 1)
+        self.assertEqual(self.post_to_cart('clear', {}).status_code, 200)
+        self.assertStock(self.product, 10)
+        self.assertStock(self.other, 10)
+        self.assertHeld({})
+
+    def test_expiry_releases_stock(self):
+        self.add_item(self.product, 4)
+        self.add_item(self.other, 1)
+        StockReservation.objects.filter(product=self.product).update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        self.assertEqual(release_expired_reservations(), 1)
+        self.assertStock(self.product, 10)
+        self.assertStock(self.other, 9)
+        self.assertHeld({self.other.pk: 1})
+
+    def test_checkout_consumes_reservation(self):
+        self.add_item(self.product, 4)
+        response = self.post(OrderViewSet, 'create', '/api/orders/', {
+            'cart_id': self.cart.pk,
+            'shipping_address': '1 Main Street',
+            'billing_address': '1 Main Street',
+            'phone_number': '5550100',
+            'email': self.user.email,
+            'items': [
+                {'product_id': self.product.pk, 'quantity': 4},
+                {'product_id': self.other.pk, 'quantity': 2},
+            ],
+        })
+        self.assertEqual(response.status_code, 201)
+        # The held 4 become the sale, so stock is not taken a second time
+        self.assertStock(self.product, 6)
+        self.assertStock(self.other, 8)
+        self.assertHeld({})
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+
+    def test_batch_update(self):
+        self.add_item(self.product, 2)
+        response = self.post_to_cart('update_items', {'items': [
+            {'product_id': self.product.pk, 'quantity': 5},
+            {'product_id': self.other.pk, 'quantity': 3},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertStock(self.product, 5)
+        self.assertStock(self.other, 7)
+        self.assertHeld({self.product.pk: 5, self.other.pk: 3})
+
+    def test_batch_update_is_all_or_nothing(self):
+        self.add_item(self.product, 2)
+        response = self.post_to_cart('update_items', {'mode': 'add', 'items': [
+            {'product_id': self.product.pk, 'quantity': 3},
+            {'product_id': self.other.pk, 'quantity': 11},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['available'], {self.other.pk: 10})
+        self.assertStock(self.product, 8)
+        self.assertStock(self.other, 10)
+        self.assertHeld({self.product.pk: 2})
+        self.assertEqual(
+            dict(CartItem.objects.filter(cart=self.cart).values_list('product_id', 'quantity')),
+            {self.product.pk: 2}
+        )
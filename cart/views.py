@@ -1,27 +1,58 @@
 from django.shortcuts import render
+from django.db import transaction
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from .models import Cart, CartItem
-from .serializers import CartSerializer, CartItemSerializer
+from ecommerce.views import SparseFieldsetMixin
+from .models import Cart
+from .serializers import CartSerializer, CartReadSerializer
+from .reservations import release_reservations, reserve_stock
+from .store import get_cart_store
 from products.models import Product, Discount
+from products.inventory import InsufficientStock
+from products.cache import get_discount
 
-class CartViewSet(viewsets.ModelViewSet):
+class CartViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_serializer_class(self):
+        # Only create and update read input; every other action returns a cart
+        if self.action in ['create', 'update', 'partial_update']:
+            return CartSerializer
+        return CartReadSerializer
+
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
+        queryset = self.setup_eager_loading(Cart.objects.filter(user=self.request.user))
+        if get_cart_store().keeps_items:
+            # Items are attached from the cart store when serializing
+            queryset = queryset.prefetch_related(None)
+        return queryset
+
+    def get_cart_response(self, cart):
+        # Reload so the response reflects the mutation with related rows batched
+        cart = self.get_queryset().get(pk=cart.pk)
+        serializer = self.get_serializer(cart)
+        return Response(serializer.data)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def perform_update(self, serializer):
+        # The write serializer renders items from the database
+        get_cart_store().persist(serializer.instance)
+        serializer.save()
+
+    def perform_destroy(self, instance):
+        release_reservations(instance)
+        get_cart_store().clear(instance)
+        instance.delete()
+
     @action(detail=True, methods=['post'])
     def add_item(self, request, pk=None):
         cart = self.get_object()
         product_id = request.data.get('product_id')
-        quantity = int(request.data.get('quantity', 1))
 
         if not product_id:
             return Response(
@@ -29,6 +60,19 @@ class CartViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        try:
+            quantity = int(request.data.get('quantity', 1))
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'Quantity must be a number'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if quantity < 1:
+            return Response(
+                {'error': 'Quantity must be a positive number'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         try:
             product = Product.objects.get(id=product_id)
         except Product.DoesNotExist:
@@ -37,29 +81,19 @@ class CartViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        if quantity > product.stock:
+        store = get_cart_store()
+        new_quantity = quantity + store.get_quantities(cart).get(product.pk, 0)
+
+        try:
+            reserve_stock(cart, {product.pk: new_quantity})
+        except InsufficientStock as exc:
             return Response(
-                {'error': f'Only {product.stock} items available in stock'},
+                {'error': f'Only {exc.shortages[product.pk]} items available in stock'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            defaults={'quantity': quantity}
-        )
-
-        if not created:
-            cart_item.quantity += quantity
-            if cart_item.quantity > product.stock:
-                return Response(
-                    {'error': f'Only {product.stock} items available in stock'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            cart_item.save()
-
-        serializer = self.get_serializer(cart)
-        return Response(serializer.data)
+        store.set_quantities(cart, {product.pk: new_quantity})
+        return self.get_cart_response(cart)
 
     @action(detail=True, methods=['post'])
     def remove_item(self, request, pk=None):
@@ -73,16 +107,24 @@ class CartViewSet(viewsets.ModelViewSet):
             )
 
         try:
-            cart_item = cart.items.get(product_id=product_id)
-            cart_item.delete()
-            serializer = self.get_serializer(cart)
-            return Response(serializer.data)
-        except CartItem.DoesNotExist:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'Product ID must be a number'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        store = get_cart_store()
+        if product_id not in store.get_quantities(cart):
             return Response(
                 {'error': 'Product not found in cart'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        release_reservations(cart, [product_id])
+        store.set_quantities(cart, {product_id: 0})
+        return self.get_cart_response(cart)
+
     @action(detail=True, methods=['post'])
     def update_item_quantity(self, request, pk=None):
         cart = self.get_object()
@@ -96,34 +138,108 @@ class CartViewSet(viewsets.ModelViewSet):
             )
 
         try:
+            product_id = int(product_id)
             quantity = int(quantity)
-        except ValueError:
+        except (TypeError, ValueError):
             return Response(
-                {'error': 'Quantity must be a number'},
+                {'error': 'Product ID and quantity must be numbers'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            cart_item = cart.items.get(product_id=product_id)
-            if quantity <= 0:
-                cart_item.delete()
-            else:
-                if quantity > cart_item.product.stock:
-                    return Response(
-                        {'error': f'Only {cart_item.product.stock} items available in stock'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                cart_item.quantity = quantity
-                cart_item.save()
-
-            serializer = self.get_serializer(cart)
-            return Response(serializer.data)
-        except CartItem.DoesNotExist:
+        store = get_cart_store()
+        if product_id not in store.get_quantities(cart):
             return Response(
                 {'error': 'Product not found in cart'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        if quantity <= 0:
+            release_reservations(cart, [product_id])
+            quantity = 0
+        else:
+            try:
+                reserve_stock(cart, {product_id: quantity})
+            except InsufficientStock as exc:
+                return Response(
+                    {'error': f'Only {exc.shortages[product_id]} items available in stock'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        store.set_quantities(cart, {product_id: quantity})
+        return self.get_cart_response(cart)
+
+    @action(detail=True, methods=['post'])
+    def update_items(self, request, pk=None):
+        """
+        Apply many ``{product_id, quantity}`` operations in one request.
+        With mode ``set`` (the default) the quantity replaces the one in the
+        cart and 0 removes the item; with mode ``add`` it is added to it.
+        """
+        cart = self.get_object()
+        operations = request.data.get('items')
+        mode = request.data.get('mode', 'set')
+
+        if mode not in ('set', 'add'):
+            return Response(
+                {'error': 'Mode must be set or add'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not isinstance(operations, list) or not operations:
+            return Response(
+                {'error': 'Items must be a non-empty list'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Repeated products are combined the way applying them in turn would
+        requested = {}
+        for operation in operations:
+            try:
+                product_id = int(operation['product_id'])
+                quantity = int(operation['quantity'])
+            except (TypeError, KeyError, ValueError):
+                return Response(
+                    {'error': 'Each item needs a numeric product_id and quantity'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if quantity < 0 or (mode == 'add' and quantity == 0):
+                return Response(
+                    {'error': 'Quantity must be a positive number'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if mode == 'add':
+                requested[product_id] = requested.get(product_id, 0) + quantity
+            else:
+                requested[product_id] = quantity
+
+        found = set(Product.objects.filter(pk__in=requested).values_list('pk', flat=True))
+        missing = [product_id for product_id in requested if product_id not in found]
+        if missing:
+            return Response(
+                {'error': 'Products not found', 'product_ids': missing},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        store = get_cart_store()
+        with transaction.atomic():
+            held = store.get_quantities(cart)
+            quantities = {
+                product_id: quantity + (held.get(product_id, 0) if mode == 'add' else 0)
+                for product_id, quantity in requested.items()
+            }
+
+            try:
+                reserve_stock(cart, quantities)
+            except InsufficientStock as exc:
+                return Response(
+                    {'error': 'Not enough stock for some products', 'available': exc.shortages},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            store.set_quantities(cart, quantities)
+
+        return self.get_cart_response(cart)
+
     @action(detail=True, methods=['post'])
     def apply_discount(self, request, pk=None):
         cart = self.get_object()
@@ -136,7 +252,7 @@ class CartViewSet(viewsets.ModelViewSet):
             )
 
         try:
-            discount = Discount.objects.get(code=discount_code)
+            discount = get_discount(discount_code)
             if not discount.is_valid:
                 return Response(
                     {'error': 'This discount code is not valid'},
@@ -145,8 +261,7 @@ class CartViewSet(viewsets.ModelViewSet):
 
             cart.discount = discount
             cart.save()
-            serializer = self.get_serializer(cart)
-            return Response(serializer.data)
+            return self.get_cart_response(cart)
         except Discount.DoesNotExist:
             return Response(
                 {'error': 'Invalid discount code'},
@@ -158,14 +273,13 @@ class CartViewSet(viewsets.ModelViewSet):
         cart = self.get_object()
         cart.discount = None
         cart.save()
-        serializer = self.get_serializer(cart)
-        return Response(serializer.data)
+        return self.get_cart_response(cart)
 
     @action(detail=True, methods=['post'])
     def clear(self, request, pk=None):
         cart = self.get_object()
-        cart.items.all().delete()
+        release_reservations(cart)
+        get_cart_store().clear(cart)
         cart.discount = None
         cart.save()
-        serializer = self.get_serializer(cart)
-        return Response(serializer.data)
+        return self.get_cart_response(cart)
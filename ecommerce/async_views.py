@@ -0,0 +1,50 @@
+"""
+Serve hot read endpoints from a bounded thread pool under ASGI.
+
+Django runs synchronous views on one shared thread when served over ASGI,
+so a single slow MongoDB query holds up every request on the process.
+djongo has no async driver, and Django's async ORM methods run on that same
+shared thread, so async ORM calls would not help. Instead these views are
+async wrappers that run the usual DRF view in a pool of
+ASYNC_VIEW_THREADS threads. The event loop stays free for other requests,
+and the number of threads and database connections stays fixed.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'ASYNC_VIEW_THREADS', 16),
+    thread_name_prefix='async-view'
+)
+
+
+def run_view(view, request, *args, **kwargs):
+    try:
+        response = view(request, *args, **kwargs)
+        # Render in the pool too, not on Django's shared sync thread
+        if callable(getattr(response, 'render', None)):
+            response = response.render()
+        return response
+    finally:
+        # Pool threads hold their own connections; release them the way
+        # request_finished does for synchronous requests
+        close_old_connections()
+
+
+def async_view(view):
+    """Wrap a synchronous view so ASGI runs it in the view thread pool."""
+    run = sync_to_async(run_view, thread_sensitive=False, executor=executor)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run(view, request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_viewset_view(viewset, actions, basename, detail):
+    """Build the same view a router would for ``actions``, served by ``async_view``."""
+    return async_view(viewset.as_view(actions, basename=basename, detail=detail))
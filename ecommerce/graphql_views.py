@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from graphene_django.views import GraphQLView
+from graphql import ExecutionResult, GraphQLError, parse, validate
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from .schema import MAX_PAGE_SIZE, PAGINATED_FIELDS
+from .validation import get_validation_rules
+
+
+class JWTGraphQLView(GraphQLView):
+    """
+    GraphQL endpoint authenticated with the same JWT bearer tokens as the
+    REST API, with query depth and complexity limits.
+    """
+    def get_validation_rules(self):
+        return get_validation_rules(
+            max_depth=getattr(settings, 'GRAPHQL_MAX_DEPTH', 8),
+            max_complexity=getattr(settings, 'GRAPHQL_MAX_COMPLEXITY', 5000),
+            paginated_fields=PAGINATED_FIELDS,
+            max_page_size=MAX_PAGE_SIZE
+        )
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        # GraphQLView runs only the standard rules when executing, so the
+        # limits are checked here, before any resolver runs
+        if query:
+            try:
+                document = parse(query)
+            except GraphQLError:
+                # Reported by GraphQLView as usual
+                document = None
+            if document is not None:
+                errors = validate(self.schema.graphql_schema, document, self.get_validation_rules())
+                if errors:
+                    return ExecutionResult(errors=errors)
+        return super().execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            result = JWTAuthentication().authenticate(request)
+        except (InvalidToken, AuthenticationFailed) as e:
+            return JsonResponse({'errors': [{'message': str(e.detail)}]}, status=401)
+        # Only bearer tokens authenticate here, as in the REST API
+        request.user = result[0] if result else AnonymousUser()
+        return super().dispatch(request, *args, **kwargs)
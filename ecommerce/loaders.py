@@ -0,0 +1,120 @@
+"""
+Per-request batch loaders for the GraphQL schema.
+
+GraphQL is executed synchronously here, so loaders cannot wait for every
+sibling resolver to ask for its key the way promise-based DataLoaders do.
+Instead, whoever fetches a list of objects announces the keys their
+children will need with ``prepare``. The first ``load`` then fetches every
+announced key in one query. Each batch function prepares the next level
+down, so a query of any shape costs one query per level.
+"""
+from collections import defaultdict
+from cart.models import Cart, CartItem
+from cart.store import get_cart_store
+from orders.models import OrderItem
+from products.models import Category, Product, ProductImage
+
+
+class DataLoader:
+    def __init__(self, batch_load, default=None):
+        self.batch_load = batch_load
+        self.default = default
+        self.cache = {}
+        self.pending = set()
+
+    def prepare(self, keys):
+        self.pending.update(key for key in keys if key not in self.cache)
+
+    def prime(self, key, value):
+        """Cache ``value`` for ``key`` when it was already loaded elsewhere."""
+        self.pending.discard(key)
+        self.cache.setdefault(key, value)
+
+    def load(self, key):
+        if key not in self.cache:
+            self.pending.add(key)
+            keys = list(self.pending)
+            self.pending.clear()
+            results = self.batch_load(keys)
+            for batch_key in keys:
+                self.cache[batch_key] = results.get(batch_key, self.default)
+        return self.cache[key]
+
+
+def group_by(objects, attribute):
+    grouped = defaultdict(list)
+    for obj in objects:
+        grouped[getattr(obj, attribute)].append(obj)
+    return grouped
+
+
+class Loaders:
+    def __init__(self):
+        self.category = DataLoader(self.load_categories)
+        self.product = DataLoader(self.load_products)
+        self.product_images = DataLoader(self.load_product_images, default=[])
+        self.cart_items = DataLoader(self.load_cart_items, default=[])
+        self.order_items = DataLoader(self.load_order_items, default=[])
+
+    def prepare_products(self, products):
+        products = list(products)
+        self.category.prepare(product.category_id for product in products)
+        self.product_images.prepare(product.pk for product in products)
+
+    def prepare_categories(self, categories):
+        self.category.prepare(category.parent_id for category in categories if category.parent_id)
+
+    def prime_cart_items(self, carts):
+        """
+        Reuse the items a cart store attached to ``carts``, with their
+        products, instead of loading them again.
+        """
+        for cart in carts:
+            items = getattr(cart, '_prefetched_objects_cache', {}).get('items')
+            if items is None:
+                self.cart_items.prepare([cart.pk])
+                continue
+            items = list(items)
+            self.cart_items.prime(cart.pk, items)
+            products = [item.product for item in items if CartItem.product.is_cached(item)]
+            for product in products:
+                self.product.prime(product.pk, product)
+            self.prepare_products(products)
+
+    def load_categories(self, category_ids):
+        categories = Category.objects.in_bulk(category_ids)
+        self.prepare_categories(categories.values())
+        return categories
+
+    def load_products(self, product_ids):
+        products = Product.objects.in_bulk(product_ids)
+        self.prepare_products(products.values())
+        return products
+
+    def load_product_images(self, product_ids):
+        return group_by(ProductImage.objects.filter(product_id__in=product_ids), 'product_id')
+
+    def load_cart_items(self, cart_ids):
+        store = get_cart_store()
+        if store.keeps_items:
+            # attach_items gives items the primary key of their persisted row
+            carts = [Cart(pk=cart_id) for cart_id in cart_ids]
+            store.attach_items(carts)
+            grouped = {cart.pk: list(cart.items.all()) for cart in carts}
+        else:
+            grouped = group_by(CartItem.objects.filter(cart_id__in=cart_ids), 'cart_id')
+        self.product.prepare(item.product_id for items in grouped.values() for item in items)
+        return grouped
+
+    def load_order_items(self, order_ids):
+        grouped = group_by(OrderItem.objects.filter(order_id__in=order_ids), 'order_id')
+        self.product.prepare(item.product_id for items in grouped.values() for item in items)
+        return grouped
+
+
+def get_loaders(info):
+    """Return the loaders of the request being executed, creating them once."""
+    request = info.context
+    if not hasattr(request, 'graphql_loaders'):
+        request.graphql_loaders = Loaders()
+    return request.graphql_loaders
@@ -0,0 +1,202 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks past the last row seen on
+    ``(ordering fields..., id)`` instead of counting and skipping, so page N
+    costs the same as page 1.
+
+    The ordering comes from the view's OrderingFilter when the client asks
+    for one, then from any ordering already on the queryset, then from
+    ``ordering``. The total count is only computed
+    when requested with ``?count=true``.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+    ordering = ('-created_at',)
+    rank_start = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.count = queryset.count() if self.wants_count(request) else None
+
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor['reverse']
+        ordering = [self._invert(field) for field in self.ordering] if reverse else self.ordering
+
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None:
+            queryset = queryset.filter(self.get_seek_filter(ordering, cursor['position']))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def paginate_ranked_queryset(self, queryset, ranked_ids, request, view=None):
+        """
+        Paginate ``queryset`` in the order of ``ranked_ids`` (e.g. search
+        relevance) rather than by keyset. The cursor holds the position in
+        the ranked ids that pass the queryset's filters, which are read in
+        one query; only the rows of the requested page are then loaded.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        # The cursor position is a single offset into the ranked ids
+        self.ordering = ('rank',)
+
+        matching = set(queryset.values_list('pk', flat=True))
+        ranked_ids = [pk for pk in ranked_ids if pk in matching]
+        self.count = len(ranked_ids) if self.wants_count(request) else None
+
+        cursor = self.decode_cursor(request)
+        start = 0
+        if cursor is not None:
+            start = cursor['position'][0]
+            if not isinstance(start, int) or start < 0:
+                raise NotFound(self.invalid_cursor_message)
+            if cursor['reverse']:
+                start = max(start - self.page_size, 0)
+
+        page_ids = ranked_ids[start:start + self.page_size]
+        rows = queryset.order_by().in_bulk(page_ids)
+        self.page = [rows[pk] for pk in page_ids if pk in rows]
+        self.rank_start = start
+        self.has_next = start + self.page_size < len(ranked_ids)
+        self.has_previous = start > 0
+        return self.page
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def wants_count(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            for backend in getattr(view, 'filter_backends', []):
+                if issubclass(backend, OrderingFilter):
+                    ordering = backend().get_ordering(request, queryset, view)
+                    break
+        if not ordering:
+            ordering = [field for field in queryset.query.order_by if isinstance(field, str)]
+        ordering = list(ordering or self.ordering)
+
+        ordering = ['-id' if field == '-pk' else 'id' if field == 'pk' else field for field in ordering]
+        if not any(field.lstrip('-') == 'id' for field in ordering):
+            # Break ties on the primary key so every position is unique
+            ordering.append('-id' if ordering[0].startswith('-') else 'id')
+        return ordering
+
+    def get_seek_filter(self, ordering, position):
+        """
+        Build ``(a > x) | (a == x & b > y) | ...`` for the given ordering,
+        flipping each comparison for descending fields.
+        """
+        seek = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            seek |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return seek
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        if self.rank_start is not None:
+            return self.encode_position([self.rank_start + self.page_size], reverse=False)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        if self.rank_start is not None:
+            return self.encode_position([self.rank_start], reverse=True)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, instance, reverse):
+        position = [_encode_value(getattr(instance, field.lstrip('-'))) for field in self.ordering]
+        return self.encode_position(position, reverse)
+
+    def encode_position(self, position, reverse):
+        payload = json.dumps({'p': position, 'r': reverse}, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            position = payload['p']
+            reverse = bool(payload['r'])
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return {'position': position, 'reverse': reverse}
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
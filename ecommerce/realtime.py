@@ -0,0 +1,18 @@
+import asyncio
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+
+def group_send_many(messages):
+    """
+    Send ``[(group, message), ...]`` through the channel layer concurrently
+    from synchronous code such as Celery tasks.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not messages:
+        return
+
+    async def send():
+        await asyncio.gather(*(channel_layer.group_send(group, message) for group, message in messages))
+
+    async_to_sync(send)()
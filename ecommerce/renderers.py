@@ -0,0 +1,48 @@
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from rest_framework.renderers import JSONRenderer
+
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS if orjson else 0
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson and produces the same bytes as the
+    stock renderer under the default compact, unicode and strict settings.
+
+    Datetimes, Decimals, lazy strings and dataclasses are passed to the DRF
+    encoder so they are formatted exactly as before. Indented output,
+    non-default JSON settings and data orjson rejects (non-string keys,
+    integers over 64 bits) are rendered by the stock renderer.
+
+    orjson writes floats in exponent notation differently from ``json``
+    (``1e16`` rather than ``1e+16``). Money is rendered as strings, so no API
+    response contains such floats.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        if orjson is None or not self.is_default_format(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same escaping the stock renderer applies for JavaScript embedding
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+    def is_default_format(self, accepted_media_type, renderer_context):
+        return (
+            self.get_indent(accepted_media_type, renderer_context) is None and
+            self.compact and
+            self.strict and
+            not self.ensure_ascii
+        )
@@ -0,0 +1,8 @@
+from django.urls import path
+from orders.consumers import OrderStatusConsumer
+from products.consumers import StockConsumer
+
+websocket_urlpatterns = [
+    path('ws/stock/', StockConsumer.as_asgi()),
+    path('ws/orders/', OrderStatusConsumer.as_asgi()),
+]
@@ -0,0 +1,184 @@
+import graphene
+from graphene_django import DjangoObjectType
+from graphql import GraphQLError
+from cart.models import Cart, CartItem
+from cart.pricing import price_carts
+from cart.store import get_cart_store
+from orders.models import Order, OrderItem
+from products.models import Category, Product, ProductImage
+from .loaders import get_loaders
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# Fields taking ``first``/``offset``, for the query complexity limit
+PAGINATED_FIELDS = {'products': DEFAULT_PAGE_SIZE, 'orders': DEFAULT_PAGE_SIZE}
+
+
+def get_page(queryset, first, offset):
+    first = max(0, min(first, MAX_PAGE_SIZE))
+    offset = max(0, offset)
+    return list(queryset[offset:offset + first])
+
+
+def get_user(info):
+    user = info.context.user
+    if not user.is_authenticated:
+        raise GraphQLError('Authentication required')
+    return user
+
+
+class CategoryType(DjangoObjectType):
+    class Meta:
+        model = Category
+        fields = ('id', 'name', 'slug', 'description', 'image', 'parent')
+
+    def resolve_parent(category, info):
+        if category.parent_id is None:
+            return None
+        return get_loaders(info).category.load(category.parent_id)
+
+
+class ProductImageType(DjangoObjectType):
+    class Meta:
+        model = ProductImage
+        fields = ('id', 'image', 'is_primary')
+
+
+class ProductType(DjangoObjectType):
+    images = graphene.List(graphene.NonNull(ProductImageType), required=True)
+
+    class Meta:
+        model = Product
+        fields = (
+            'id', 'name', 'slug', 'description', 'price', 'category', 'stock',
+            'is_active', 'created_at', 'updated_at'
+        )
+
+    def resolve_category(product, info):
+        return get_loaders(info).category.load(product.category_id)
+
+    def resolve_images(product, info):
+        return get_loaders(info).product_images.load(product.pk)
+
+
+class CartItemType(DjangoObjectType):
+    # Null for items the Redis cart store has not written to the database yet
+    id = graphene.ID()
+    subtotal = graphene.Decimal(required=True)
+
+    class Meta:
+        model = CartItem
+        fields = ('id', 'product', 'quantity')
+
+    def resolve_product(item, info):
+        return get_loaders(info).product.load(item.product_id)
+
+    def resolve_subtotal(item, info):
+        return item.quantity * get_loaders(info).product.load(item.product_id).price
+
+
+class CartType(DjangoObjectType):
+    items = graphene.List(graphene.NonNull(CartItemType), required=True)
+    subtotal = graphene.Decimal(required=True)
+    total = graphene.Decimal(required=True)
+
+    class Meta:
+        model = Cart
+        fields = ('id', 'items', 'created_at', 'updated_at')
+
+    def resolve_items(cart, info):
+        return get_loaders(info).cart_items.load(cart.pk)
+
+
+class OrderItemType(DjangoObjectType):
+    class Meta:
+        model = OrderItem
+        fields = ('id', 'product', 'quantity', 'price', 'subtotal')
+
+    def resolve_product(item, info):
+        return get_loaders(info).product.load(item.product_id)
+
+
+class OrderType(DjangoObjectType):
+    items = graphene.List(graphene.NonNull(OrderItemType), required=True)
+
+    class Meta:
+        model = Order
+        fields = (
+            'id', 'order_number', 'status', 'payment_status', 'shipping_address',
+            'billing_address', 'phone_number', 'email', 'items', 'subtotal',
+            'shipping_cost', 'discount_amount', 'total', 'notes',
+            'tracking_number', 'estimated_delivery_date', 'created_at', 'updated_at'
+        )
+
+    def resolve_items(order, info):
+        return get_loaders(info).order_items.load(order.pk)
+
+
+class Query(graphene.ObjectType):
+    categories = graphene.List(graphene.NonNull(CategoryType), required=True)
+    category = graphene.Field(CategoryType, slug=graphene.String(required=True))
+    products = graphene.List(
+        graphene.NonNull(ProductType),
+        required=True,
+        category=graphene.String(),
+        first=graphene.Int(default_value=DEFAULT_PAGE_SIZE),
+        offset=graphene.Int(default_value=0)
+    )
+    product = graphene.Field(ProductType, slug=graphene.String(required=True))
+    carts = graphene.List(graphene.NonNull(CartType), required=True)
+    orders = graphene.List(
+        graphene.NonNull(OrderType),
+        required=True,
+        status=graphene.String(),
+        first=graphene.Int(default_value=DEFAULT_PAGE_SIZE),
+        offset=graphene.Int(default_value=0)
+    )
+    order = graphene.Field(OrderType, id=graphene.ID(required=True))
+
+    def resolve_categories(root, info):
+        categories = list(Category.objects.all())
+        get_loaders(info).prepare_categories(categories)
+        return categories
+
+    def resolve_category(root, info, slug):
+        return Category.objects.filter(slug=slug).first()
+
+    def resolve_products(root, info, category=None, first=DEFAULT_PAGE_SIZE, offset=0):
+        queryset = Product.objects.filter(is_active=True)
+        if category:
+            queryset = queryset.filter(category__slug=category)
+        products = get_page(queryset, first, offset)
+        get_loaders(info).prepare_products(products)
+        return products
+
+    def resolve_product(root, info, slug):
+        return Product.objects.filter(slug=slug).first()
+
+    def resolve_carts(root, info):
+        carts = list(Cart.objects.filter(user=get_user(info)).select_related('discount'))
+        # Totals for every cart in one query (or from the cart store)
+        get_cart_store().attach_items(carts)
+        get_loaders(info).prime_cart_items(carts)
+        price_carts(carts)
+        return carts
+
+    def resolve_orders(root, info, status=None, first=DEFAULT_PAGE_SIZE, offset=0):
+        user = get_user(info)
+        queryset = Order.objects.all() if user.is_staff else Order.objects.filter(user=user)
+        if status:
+            queryset = queryset.filter(status=status)
+        orders = get_page(queryset.order_by('-created_at'), first, offset)
+        get_loaders(info).order_items.prepare(order.pk for order in orders)
+        return orders
+
+    def resolve_order(root, info, id):
+        user = get_user(info)
+        queryset = Order.objects.all() if user.is_staff else Order.objects.filter(user=user)
+        try:
+            return queryset.filter(pk=int(id)).first()
+        except ValueError:
+            return None
+
+
+schema = graphene.Schema(query=Query)
@@ -182,6 +182,15 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'ecommerce.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'ecommerce.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
     ),
@@ -214,6 +223,44 @@ CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'release-expired-stock-reservations': {
+        'task': 'cart.tasks.release_expired_stock_reservations',
+        'schedule': timedelta(minutes=1),
+    },
+    'relay-order-outbox-events': {
+        'task': 'orders.tasks.relay_outbox_events',
+        'schedule': timedelta(seconds=5),
+    },
+    'prune-order-outbox-events': {
+        'task': 'orders.tasks.prune_outbox_events',
+        'schedule': timedelta(hours=1),
+    },
+    'persist-cart-store': {
+        'task': 'cart.tasks.persist_cart_store',
+        'schedule': timedelta(minutes=1),
+    },
+    'push-stock-level-updates': {
+        'task': 'products.tasks.push_stock_level_updates',
+        'schedule': timedelta(seconds=1),
+    },
+}
+
+# Published order outbox events are deleted after this many hours
+OUTBOX_RETENTION_HOURS = int(os.getenv('OUTBOX_RETENTION_HOURS', 24))
+
+# Order numbers (optional fixed worker id per process, 0-1023)
+ORDER_NUMBER_WORKER_ID = os.getenv('ORDER_NUMBER_WORKER_ID')
+
+# Cart stock reservations
+CART_RESERVATION_MINUTES = int(os.getenv('CART_RESERVATION_MINUTES', 30))
+
+# Cart item storage: 'database' or 'redis' (write-behind through CACHES)
+CART_STORE = os.getenv('CART_STORE', 'database')
+CART_STORE_TIMEOUT = int(os.getenv('CART_STORE_TIMEOUT', 60 * 60 * 48))
+
+# Threads serving the async catalogue and cart views under ASGI
+ASYNC_VIEW_THREADS = int(os.getenv('ASYNC_VIEW_THREADS', 16))
 
 # Channels settings
 CHANNEL_LAYERS = {
@@ -237,6 +284,8 @@ if not DEBUG:
 GRAPHENE = {
     'SCHEMA': 'ecommerce.schema.schema'
 }
+GRAPHQL_MAX_DEPTH = int(os.getenv('GRAPHQL_MAX_DEPTH', 8))
+GRAPHQL_MAX_COMPLEXITY = int(os.getenv('GRAPHQL_MAX_COMPLEXITY', 5000))
 
 # Email settings
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -245,6 +294,8 @@ EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))
 EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True') == 'True'
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
+EMAIL_TIMEOUT = int(os.getenv('EMAIL_TIMEOUT', 10))
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'webmaster@localhost')
 
 # Custom user model
 AUTH_USER_MODEL = 'accounts.User'
@@ -0,0 +1,109 @@
+import io
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer
+
+PAYLOADS = {
+    'decimals': {'price': Decimal('19.99'), 'total': Decimal('0.10'), 'whole': Decimal('5')},
+    'datetimes': {
+        'aware': datetime(2024, 3, 1, 12, 30, 45, 123456, tzinfo=timezone.utc),
+        'offset': datetime(2024, 3, 1, 12, 30, tzinfo=timezone(timedelta(hours=5, minutes=30))),
+        'naive': datetime(2024, 3, 1, 12, 30, 45),
+        'date': date(2024, 3, 1),
+        'time': time(8, 15, 30, 500),
+        'duration': timedelta(days=1, seconds=5),
+    },
+    'line separators': {'description': 'first\u2028second\u2029third'},
+    'unicode and escapes': {'name': 'Café ☃ "quoted" \\ \n\t\x01', 'emoji': '\U0001f600'},
+    'mixed': {
+        'results': [
+            {'id': 1, 'price': Decimal('9.99'), 'created_at': datetime(2024, 1, 1, tzinfo=timezone.utc)},
+            {'id': 2, 'price': None, 'tags': ['a', 'b'], 'active': True, 'ratio': 0.5},
+        ],
+        'next': None,
+        'count': 2,
+        'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'label': gettext_lazy('Order Created'),
+    },
+    'big integer': {'id': 2 ** 70},
+    'non-string keys': {1: 'one', 2: 'two'},
+}
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    def assertRendersLikeStock(self, data, accepted_media_type='application/json', renderer_context=None):
+        self.assertEqual(
+            FastJSONRenderer().render(data, accepted_media_type, renderer_context),
+            JSONRenderer().render(data, accepted_media_type, renderer_context)
+        )
+
+    def test_byte_identical_output(self):
+        for name, data in PAYLOADS.items():
+            with self.subTest(name):
+                self.assertRendersLikeStock(data)
+
+    def test_line_separators_are_escaped(self):
+        rendered = FastJSONRenderer().render({'text': 'a\u2028b\u2029c'})
+        self.assertEqual(rendered, b'{"text":"a\\u2028b\\u2029c"}')
+
+    def test_indented_output(self):
+        self.assertRendersLikeStock(PAYLOADS['mixed'], 'application/json; indent=4')
+
+    def test_no_data(self):
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+
+class FastJSONParserTests(SimpleTestCase):
+    def parse(self, parser, body):
+        return parser.parse(io.BytesIO(body), 'application/json', {})
+
+    def test_matches_stock_parser(self):
+        bodies = [
+            b'{"product_id": 12, "quantity": 3}',
+            '{"name": "Café ☃", "price": "19.99", "items": [1, 2.5, null, true]}'.encode(),
+            b'{"id": 1180591620717411303424}',
+        ]
+        for body in bodies:
+            with self.subTest(body):
+                self.assertEqual(self.parse(FastJSONParser(), body), self.parse(JSONParser(), body))
+
+
+@override_settings(GRAPHQL_MAX_DEPTH=8, GRAPHQL_MAX_COMPLEXITY=5000)
+class GraphQLLimitTests(TestCase):
+    def query(self, query):
+        return self.client.post('/api/graphql/', {'query': query}, content_type='application/json')
+
+    def assertRejected(self, response, message):
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual(len(errors), 1)
+        self.assertIn(message, errors[0]['message'])
+        self.assertNotIn('data', response.json())
+
+    def test_allowed_query(self):
+        response = self.query('{ categories { name parent { name parent { name } } } }')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'data': {'categories': []}})
+
+    def test_too_deep_query_is_rejected(self):
+        query = '{ categories { ' + 'parent { ' * 10 + 'name' + ' }' * 10 + ' } }'
+        self.assertRejected(self.query(query), 'Query is nested 11 levels deep, the limit is 8')
+
+    def test_too_costly_query_is_rejected(self):
+        # Each aliased page costs 1 plus 15 fields for each of its 100 products
+        fields = 'name slug description price stock images { id image isPrimary } category { name slug parent { name slug } }'
+        pages = ' '.join(f'page{i}: products(first: 100, offset: {i * 100}) {{ {fields} }}' for i in range(4))
+        self.assertRejected(self.query(f'{{ {pages} }}'), 'Query complexity is 6004, the limit is 5000')
+
+    def test_limits_apply_through_fragments(self):
+        query = (
+            '{ categories { ...Deep } } '
+            'fragment Deep on CategoryType { ' + 'parent { ' * 9 + 'name' + ' }' * 9 + ' }'
+        )
+        self.assertRejected(self.query(query), 'the limit is 8')
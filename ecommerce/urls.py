@@ -13,8 +13,10 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
@@ -26,6 +28,8 @@ from accounts.views import (
 from products.views import CategoryViewSet, ProductViewSet, DiscountViewSet
 from cart.views import CartViewSet
 from orders.views import OrderViewSet
+from .async_views import async_viewset_view
+from .graphql_views import JWTGraphQLView
 
 # Create a router and register our viewsets with it
 router = DefaultRouter()
@@ -35,7 +39,41 @@ router.register(r'discounts', DiscountViewSet, basename='discount')
 router.register(r'carts', CartViewSet, basename='cart')
 router.register(r'orders', OrderViewSet, basename='order')
 
-urlpatterns = [
+LIST_ACTIONS = {'get': 'list', 'post': 'create'}
+DETAIL_ACTIONS = {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}
+
+
+def async_detail_path(prefix, viewset, basename):
+    """
+    Route ``api/<prefix>/<lookup>/`` to an async detail view. The lookup
+    never matches the url_path of a list-level action such as
+    ``products/import/``, which the router serves instead.
+    """
+    lookup = viewset.lookup_url_kwarg or viewset.lookup_field
+    lookup_regex = getattr(viewset, 'lookup_value_regex', '[^/.]+')
+    reserved = '|'.join(
+        re.escape(extra_action.url_path)
+        for extra_action in viewset.get_extra_actions()
+        if not extra_action.detail
+    )
+    exclude = f'(?!(?:{reserved})/$)' if reserved else ''
+    return re_path(
+        rf'^api/{prefix}/{exclude}(?P<{lookup}>{lookup_regex})/$',
+        async_viewset_view(viewset, DETAIL_ACTIONS, basename, detail=True)
+    )
+
+
+# Catalogue browsing and cart fetches are served by async views under ASGI.
+# They take precedence over the router's routes for the same URLs
+async_urlpatterns = [
+    path('api/products/', async_viewset_view(ProductViewSet, LIST_ACTIONS, 'product', detail=False)),
+    async_detail_path('products', ProductViewSet, 'product'),
+    path('api/categories/', async_viewset_view(CategoryViewSet, LIST_ACTIONS, 'category', detail=False)),
+    path('api/carts/', async_viewset_view(CartViewSet, LIST_ACTIONS, 'cart', detail=False)),
+    async_detail_path('carts', CartViewSet, 'cart'),
+]
+
+urlpatterns = async_urlpatterns + [
     path('admin/', admin.site.urls),
     
     # Authentication endpoints
@@ -48,6 +86,8 @@ urlpatterns = [
 
     # API endpoints
     path('api/', include(router.urls)),
+    # Token authenticated, so exempt from the session CSRF check
+    path('api/graphql/', csrf_exempt(JWTGraphQLView.as_view(graphiql=settings.DEBUG))),
 ]
 
 # Serve media files in development
@@ -0,0 +1,25 @@
+from itertools import islice
+from django.db import connection
+
+try:
+    from itertools import batched
+except ImportError:
+    # itertools.batched is new in Python 3.12; Django 5.0 also runs on 3.10
+    def batched(iterable, n):
+        """Yield tuples of up to ``n`` items from ``iterable``."""
+        if n < 1:
+            raise ValueError('n must be at least one')
+        iterator = iter(iterable)
+        while batch := tuple(islice(iterator, n)):
+            yield batch
+
+
+def uses_mongo():
+    return connection.vendor == 'djongo'
+
+
+def get_collection(model):
+    """Return the pymongo collection storing ``model`` on djongo."""
+    # djongo exposes the pymongo Database as the raw connection
+    connection.ensure_connection()
+    return connection.connection[model._meta.db_table]
@@ -0,0 +1,105 @@
+"""
+Query cost limits for the GraphQL endpoint, run as validation rules so an
+expensive query is rejected before any resolver runs.
+"""
+from graphql import GraphQLError, ValidationRule
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode, IntValueNode
+
+
+def get_page_size(field, paginated_fields, max_page_size):
+    """
+    The number of results a paginated field can return: its literal
+    ``first`` argument, the largest page when ``first`` is a variable, or
+    the field's default page size. Other fields count as one result.
+    """
+    name = field.name.value
+    if name not in paginated_fields:
+        return 1
+    for argument in field.arguments or ():
+        if argument.name.value == 'first':
+            if isinstance(argument.value, IntValueNode):
+                return max(1, min(int(argument.value.value), max_page_size))
+            return max_page_size
+    return paginated_fields[name]
+
+
+def depth_limit_rule(max_depth):
+    class DepthLimitRule(ValidationRule):
+        def enter_operation_definition(self, node, *args):
+            depth = self.get_depth(node.selection_set, 0, set())
+            if depth > max_depth:
+                self.report_error(GraphQLError(
+                    f'Query is nested {depth} levels deep, the limit is {max_depth}', node
+                ))
+
+        def get_depth(self, selection_set, depth, visited):
+            deepest = depth
+            for selection in selection_set.selections if selection_set else ():
+                if isinstance(selection, FieldNode):
+                    if selection.selection_set:
+                        deepest = max(deepest, self.get_depth(selection.selection_set, depth + 1, visited))
+                else:
+                    child = self.get_fragment_selections(selection, visited)
+                    deepest = max(deepest, self.get_depth(child, depth, visited))
+            return deepest
+
+        def get_fragment_selections(self, selection, visited):
+            if isinstance(selection, InlineFragmentNode):
+                return selection.selection_set
+            # Fragment cycles are reported by the standard rules
+            name = selection.name.value
+            if name in visited:
+                return None
+            visited.add(name)
+            fragment = self.context.get_fragment(name)
+            return fragment.selection_set if fragment else None
+
+    return DepthLimitRule
+
+
+def complexity_limit_rule(max_complexity, paginated_fields, max_page_size):
+    """
+    Every selected field costs one, multiplied by the page size of each
+    paginated field above it (``paginated_fields`` maps field names to
+    their default page size). Unpaginated lists count once.
+    """
+    class ComplexityLimitRule(ValidationRule):
+        def enter_operation_definition(self, node, *args):
+            complexity = self.get_complexity(node.selection_set, 1, frozenset())
+            if complexity > max_complexity:
+                self.report_error(GraphQLError(
+                    f'Query complexity is {complexity}, the limit is {max_complexity}', node
+                ))
+
+        def get_complexity(self, selection_set, multiplier, visited):
+            complexity = 0
+            for selection in selection_set.selections if selection_set else ():
+                if isinstance(selection, FieldNode):
+                    complexity += multiplier
+                    if selection.selection_set:
+                        complexity += self.get_complexity(
+                            selection.selection_set,
+                            multiplier * get_page_size(selection, paginated_fields, max_page_size),
+                            visited
+                        )
+                elif isinstance(selection, InlineFragmentNode):
+                    complexity += self.get_complexity(selection.selection_set, multiplier, visited)
+                elif isinstance(selection, FragmentSpreadNode):
+                    name = selection.name.value
+                    fragment = self.context.get_fragment(name)
+                    if fragment and name not in visited:
+                        complexity += self.get_complexity(fragment.selection_set, multiplier, visited | {name})
+            return complexity
+
+    return ComplexityLimitRule
+
+
+def get_validation_rules(max_depth, max_complexity, paginated_fields, max_page_size):
+    """
+    The limit rules only. The standard rules still run when the query is
+    executed, and the limits cope with documents those rules reject.
+    """
+    return (
+        depth_limit_rule(max_depth),
+        complexity_limit_rule(max_complexity, paginated_fields, max_page_size),
+    )
@@ -0,0 +1,40 @@
+from .serializers import ReadOnlySerializer, parse_field_list
+
+
+class SparseFieldsetMixin:
+    """
+    Reads ``?fields=`` and ``?expand=`` and hands them to the view's
+    read-only serializer, which prunes its output and the related objects it
+    loads. Write serializers ignore both parameters.
+    """
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+
+    def get_sparse_fieldset(self):
+        request = getattr(self, 'request', None)
+        if request is None:
+            return None, None
+        return (
+            parse_field_list(request.query_params.get(self.fields_query_param)),
+            parse_field_list(request.query_params.get(self.expand_query_param)),
+        )
+
+    def has_sparse_fieldset(self):
+        return self.get_sparse_fieldset() != (None, None)
+
+    def uses_read_serializer(self):
+        return issubclass(self.get_serializer_class(), ReadOnlySerializer)
+
+    def setup_eager_loading(self, queryset):
+        serializer_class = self.get_serializer_class()
+        if self.uses_read_serializer():
+            fields, expand = self.get_sparse_fieldset()
+            return serializer_class.setup_eager_loading(queryset, fields=fields, expand=expand)
+        return serializer_class.setup_eager_loading(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        if self.uses_read_serializer():
+            fields, expand = self.get_sparse_fieldset()
+            kwargs.setdefault('fields', fields)
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
@@ -0,0 +1,33 @@
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from .realtime import get_order_group_name
+
+
+class OrderStatusConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Streams status changes of the authenticated user's orders.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        self.group_name = get_order_group_name(user.pk)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def order_status(self, event):
+        await self.send_json({
+            'type': 'order_status',
+            'order_id': event['order_id'],
+            'order_number': event['order_number'],
+            'status': event['status'],
+            'payment_status': event['payment_status'],
+            'tracking_number': event['tracking_number'],
+            'updated_at': event['updated_at'],
+        })
@@ -0,0 +1,84 @@
+"""
+Order notification delivery.
+
+Each worker thread keeps one SMTP connection open and reuses it for every
+message, reconnecting only when the server drops it. Point EMAIL_HOST and
+EMAIL_PORT at a local stand-in server (e.g. ``python -m aiosmtpd -n -l
+localhost:1025``) to exercise the real SMTP path in development.
+"""
+import threading
+from functools import lru_cache
+from smtplib import SMTPServerDisconnected
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import get_template
+
+ORDER_CONFIRMATION_TEMPLATE = 'orders/email/order_confirmation.html'
+ORDER_STATUS_UPDATE_TEMPLATE = 'orders/email/order_status_update.html'
+
+_local = threading.local()
+
+
+@lru_cache(maxsize=None)
+def get_email_template(template_name):
+    return get_template(template_name)
+
+
+def build_order_email(order, subject, template_name):
+    message = get_email_template(template_name).render({'order': order})
+    email = EmailMultiAlternatives(subject, message, settings.DEFAULT_FROM_EMAIL, [order.email])
+    email.attach_alternative(message, 'text/html')
+    return email
+
+
+def build_order_confirmation_email(order):
+    return build_order_email(
+        order, f'Order Confirmation - {order.order_number}', ORDER_CONFIRMATION_TEMPLATE
+    )
+
+
+def build_order_status_update_email(order):
+    return build_order_email(
+        order, f'Order Status Update - {order.order_number}', ORDER_STATUS_UPDATE_TEMPLATE
+    )
+
+
+def get_pooled_connection():
+    connection = getattr(_local, 'connection', None)
+    if connection is None:
+        connection = get_connection(fail_silently=False)
+        _local.connection = connection
+    # Opening an already open backend is a no-op, and a connection opened
+    # here is not closed by send_messages
+    connection.open()
+    return connection
+
+
+def close_pooled_connection():
+    connection = getattr(_local, 'connection', None)
+    if connection is not None:
+        connection.close()
+        _local.connection = None
+
+
+def send_emails(messages):
+    """
+    Send ``messages`` over this worker's pooled connection one at a time,
+    reconnecting once if the server closed the connection. Only the message
+    that hit the disconnect is sent again, so none already delivered is
+    repeated. Returns the number of messages sent.
+    """
+    sent = 0
+    for message in messages:
+        try:
+            sent += get_pooled_connection().send_messages([message]) or 0
+        except SMTPServerDisconnected:
+            close_pooled_connection()
+            sent += get_pooled_connection().send_messages([message]) or 0
+    return sent
+
+
+@worker_process_shutdown.connect
+def _close_on_shutdown(**kwargs):
+    close_pooled_connection()
@@ -0,0 +1,53 @@
+import multiprocessing
+import threading
+import time
+from django.core.management.base import BaseCommand
+from orders.numbering import generate_order_number
+
+
+def generate_numbers(count, threads):
+    """Generate ``count`` order numbers per thread in this process."""
+    numbers = [[] for _ in range(threads)]
+
+    def run(bucket):
+        for _ in range(count):
+            bucket.append(generate_order_number())
+
+    workers = [threading.Thread(target=run, args=(bucket,)) for bucket in numbers]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return [number for bucket in numbers for number in bucket]
+
+
+class Command(BaseCommand):
+    help = 'Measure order numbers generated per second under concurrency and check they are unique'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--threads', type=int, default=4, help='Threads per process')
+        parser.add_argument('--count', type=int, default=50000, help='Numbers per thread')
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        threads = options['threads']
+        count = options['count']
+
+        # Forked children lease their own worker ids, as gunicorn workers do
+        context = multiprocessing.get_context('fork')
+        start = time.perf_counter()
+        with context.Pool(processes) as pool:
+            results = pool.starmap(generate_numbers, [(count, threads)] * processes)
+        elapsed = time.perf_counter() - start
+
+        numbers = [number for result in results for number in result]
+        duplicates = len(numbers) - len(set(numbers))
+        self.stdout.write(
+            f'{len(numbers)} order numbers from {processes} processes x {threads} threads '
+            f'in {elapsed:.2f}s: {len(numbers) / elapsed:,.0f} ids/s'
+        )
+        if duplicates:
+            self.stderr.write(self.style.ERROR(f'{duplicates} duplicate order numbers'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All order numbers are unique'))
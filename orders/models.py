@@ -1,3 +1,4 @@
+from collections import defaultdict
 from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator
@@ -13,6 +14,15 @@ class Order(models.Model):
         ('cancelled', 'Cancelled'),
     )
 
+    # Statuses each status may move to through the bulk transition API
+    STATUS_TRANSITIONS = {
+        'pending': ('processing', 'cancelled'),
+        'processing': ('shipped', 'cancelled'),
+        'shipped': ('delivered',),
+        'delivered': (),
+        'cancelled': (),
+    }
+
     PAYMENT_STATUS_CHOICES = (
         ('pending', 'Pending'),
         ('completed', 'Completed'),
@@ -49,12 +59,18 @@ class Order(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.order_number:
-            # Generate order number based on timestamp and user ID
-            from django.utils import timezone
-            timestamp = timezone.now().strftime('%Y%m%d%H%M%S')
-            self.order_number = f"ORD{timestamp}{self.user.id}"
+            # Unique and time-sortable without a user fetch or a DB round trip
+            from .numbering import generate_order_number
+            self.order_number = generate_order_number()
         super().save(*args, **kwargs)
 
+    def restock_items(self):
+        from products.inventory import restock
+        quantities = defaultdict(int)
+        for product_id, quantity in self.items.values_list('product_id', 'quantity'):
+            quantities[product_id] += quantity
+        restock(quantities)
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -87,3 +103,25 @@ class OrderStatusHistory(models.Model):
 
     def __str__(self):
         return f"{self.order.order_number} - {self.status}"
+
+class OutboxEvent(models.Model):
+    ORDER_CREATED = 'order_created'
+    ORDER_STATUS_CHANGED = 'order_status_changed'
+
+    EVENT_TYPE_CHOICES = (
+        (ORDER_CREATED, 'Order Created'),
+        (ORDER_STATUS_CHANGED, 'Order Status Changed'),
+    )
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='outbox_events')
+    event_type = models.CharField(max_length=30, choices=EVENT_TYPE_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    published_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        verbose_name = _('outbox event')
+        verbose_name_plural = _('outbox events')
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.event_type} for order {self.order_id}"
@@ -0,0 +1,153 @@
+"""
+Snowflake-style order numbers.
+
+An id packs milliseconds since ``EPOCH_MS`` (41 bits), a worker id (10 bits)
+and a per-millisecond sequence (12 bits). Every worker process leases its
+own worker id from the shared cache with an add-if-absent (``SET NX``) key
+that expires after WORKER_LEASE_TIMEOUT. The lease is checked and renewed
+before issuing ids whenever WORKER_LEASE_RENEW_INTERVAL has passed, so a
+process never issues ids on a worker id another process holds, and ids of
+dead processes are free again once their lease expires. Ids are unique
+across gunicorn workers and hosts without touching the database, and they
+sort by creation time.
+"""
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+WORKER_ID_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_ID_BITS) - 1
+SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+
+ORDER_NUMBER_PREFIX = 'ORD'
+# 63 bits fit in 13 base-36 digits; fixed width keeps numbers sortable as text
+ORDER_NUMBER_WIDTH = 13
+ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+WORKER_LEASE_TIMEOUT = 60
+WORKER_LEASE_RENEW_INTERVAL = 20
+
+
+def get_worker_lease_key(worker_id):
+    return f'order_number:worker:{worker_id}'
+
+
+class WorkerLease:
+    """
+    A worker id held by this process. ``token`` identifies the holder in
+    the lease key, so a process can tell its own lease from a later one.
+    """
+    def __init__(self, worker_id, token=None):
+        self.worker_id = worker_id
+        self.token = token
+        self.renewed_at = time.monotonic()
+
+    @property
+    def is_leased(self):
+        return self.token is not None
+
+    def needs_renewal(self):
+        return self.is_leased and time.monotonic() - self.renewed_at >= WORKER_LEASE_RENEW_INTERVAL
+
+    def renew(self):
+        """Extend the lease. Returns False when it expired or was taken over."""
+        key = get_worker_lease_key(self.worker_id)
+        if cache.get(key) != self.token or not cache.touch(key, WORKER_LEASE_TIMEOUT):
+            # Lapsed while idle; it can be taken back if nobody claimed it since
+            if not cache.add(key, self.token, WORKER_LEASE_TIMEOUT):
+                return False
+        self.renewed_at = time.monotonic()
+        return True
+
+
+def allocate_worker_id():
+    """
+    Use ORDER_NUMBER_WORKER_ID when configured, otherwise lease a free
+    worker id from the shared cache. Returns a ``WorkerLease``, and raises
+    ``ImproperlyConfigured`` for a configured id out of range.
+
+    There is no safe fallback without the cache, since hashing host and pid
+    collides once there are a few dozen workers, so an unreachable cache
+    raises and ORDER_NUMBER_WORKER_ID has to be set instead.
+    """
+    configured = getattr(settings, 'ORDER_NUMBER_WORKER_ID', None)
+    if configured not in (None, ''):
+        try:
+            worker_id = int(configured)
+        except (TypeError, ValueError):
+            worker_id = -1
+        # Masking an out of range id would silently share another worker's
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ImproperlyConfigured(
+                f'ORDER_NUMBER_WORKER_ID must be an integer from 0 to {MAX_WORKER_ID}'
+            )
+        return WorkerLease(worker_id)
+
+    token = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}'
+    # Start at a random id so processes starting together rarely contend
+    start = random.randrange(MAX_WORKER_ID + 1)
+    for offset in range(MAX_WORKER_ID + 1):
+        worker_id = (start + offset) & MAX_WORKER_ID
+        if cache.add(get_worker_lease_key(worker_id), token, WORKER_LEASE_TIMEOUT):
+            return WorkerLease(worker_id, token)
+    raise RuntimeError(f'All {MAX_WORKER_ID + 1} order number worker ids are leased')
+
+
+def encode_base36(value):
+    digits = []
+    while value:
+        value, remainder = divmod(value, 36)
+        digits.append(ALPHABET[remainder])
+    return ''.join(reversed(digits)).rjust(ORDER_NUMBER_WIDTH, '0')
+
+
+class OrderNumberGenerator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._lease = None
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next_id(self):
+        with self._lock:
+            # A forked worker must not reuse its parent's worker id
+            if self._pid != os.getpid():
+                self._lease = allocate_worker_id()
+                self._pid = os.getpid()
+                self._last_ms = -1
+            elif self._lease.needs_renewal() and not self._lease.renew():
+                self._lease = allocate_worker_id()
+                self._last_ms = -1
+
+            now = int(time.time() * 1000) - EPOCH_MS
+            if now <= self._last_ms:
+                # Same millisecond, or the clock stepped back: stay on the
+                # last timestamp and move to the next sequence number
+                now = self._last_ms
+                self._sequence = (self._sequence + 1) & SEQUENCE_MASK
+                if self._sequence == 0:
+                    now += 1
+            else:
+                self._sequence = 0
+            self._last_ms = now
+
+            return (now << (WORKER_ID_BITS + SEQUENCE_BITS)) | (self._lease.worker_id << SEQUENCE_BITS) | self._sequence
+
+    def next_order_number(self):
+        return f'{ORDER_NUMBER_PREFIX}{encode_base36(self.next_id())}'
+
+
+_generator = OrderNumberGenerator()
+
+
+def generate_order_number():
+    return _generator.next_order_number()
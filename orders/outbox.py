@@ -0,0 +1,23 @@
+"""
+Transactional outbox for order events.
+
+Events are written in the same transaction as the order change they
+describe. On a database that rolls back, an event therefore exists if and
+only if the change committed. djongo cannot roll back, so a failed change
+may leave its event behind; ``relay_outbox_events`` skips events whose order
+does not exist and publishes the rest to Celery in batches.
+``prune_outbox_events`` deletes published events after
+OUTBOX_RETENTION_HOURS.
+"""
+from .models import OutboxEvent
+
+
+def record_events(event_type, order_ids):
+    """
+    Queue ``event_type`` for each order. Call inside the transaction that
+    makes the change.
+    """
+    OutboxEvent.objects.bulk_create([
+        OutboxEvent(order_id=order_id, event_type=event_type)
+        for order_id in order_ids
+    ])
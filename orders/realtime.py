@@ -0,0 +1,31 @@
+from ecommerce.realtime import group_send_many
+from .models import Order
+
+
+def get_order_group_name(user_id):
+    return f'orders_user_{user_id}'
+
+
+def push_order_status_updates(order_ids):
+    """
+    Send the current status of each order to its owner's subscribers. Orders
+    changed several times since the last relay are sent once.
+    """
+    orders = (
+        Order.objects
+        .filter(pk__in=set(order_ids))
+        .values('id', 'user_id', 'order_number', 'status', 'payment_status', 'tracking_number', 'updated_at')
+    )
+    group_send_many([
+        (get_order_group_name(order['user_id']), {
+            'type': 'order.status',
+            'order_id': order['id'],
+            'order_number': order['order_number'],
+            'status': order['status'],
+            'payment_status': order['payment_status'],
+            'tracking_number': order['tracking_number'],
+            'updated_at': order['updated_at'].isoformat(),
+        })
+        for order in orders
+    ])
+    return len(orders)
@@ -1,9 +1,19 @@
+from collections import defaultdict
+from django.db import transaction
+from django.utils.functional import cached_property
 from rest_framework import serializers
+from ecommerce.serializers import EagerLoadingMixin, ReadOnlySerializer, is_expanded, wants_field
 from .models import Order, OrderItem, OrderStatusHistory
-from products.serializers import ProductSerializer
+from products.serializers import ProductReadSerializer, ProductSerializer
 from products.models import Product, Discount
+from products.cache import get_discount
+from products.inventory import InsufficientStock, decrement_stock, restock
+from cart.reservations import consume_reservations
+
+class OrderItemSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ('product__category',)
+    prefetch_related_fields = ('product__images',)
 
-class OrderItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(),
@@ -22,7 +32,11 @@ class OrderStatusHistorySerializer(serializers.ModelSerializer):
         fields = ('id', 'status', 'notes', 'created_at')
         read_only_fields = ('created_at',)
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    prefetch_related_fields = (
+        'items__product__category', 'items__product__images', 'status_history'
+    )
+
     items = OrderItemSerializer(many=True)
     status_history = OrderStatusHistorySerializer(many=True, read_only=True)
     discount_code = serializers.CharField(write_only=True, required=False, allow_null=True)
@@ -47,10 +61,10 @@ class OrderSerializer(serializers.ModelSerializer):
             return None
             
         try:
-            discount = Discount.objects.get(code=value)
+            discount = get_discount(value)
             if not discount.is_valid:
                 raise serializers.ValidationError('This discount code is not valid.')
-            return value
+            return discount
         except Discount.DoesNotExist:
             raise serializers.ValidationError('Invalid discount code.')
 
@@ -61,21 +75,51 @@ class OrderSerializer(serializers.ModelSerializer):
                 'items': 'At least one item is required.'
             })
 
-        # Validate stock availability
-        for item in items:
-            product = item['product']
-            quantity = item['quantity']
-            if quantity > product.stock:
-                raise serializers.ValidationError({
-                    'items': f'Only {product.stock} items available for {product.name}.'
-                })
-
+        # Stock is checked atomically when the order is created, since part
+        # of it may already be held for the shopper's cart
         return attrs
 
     def create(self, validated_data):
+        with transaction.atomic():
+            return self._create(validated_data)
+
+    def _create(self, validated_data):
         items_data = validated_data.pop('items')
-        discount_code = validated_data.pop('discount_code', None)
-        
+        # Resolved to a Discount instance by validate_discount_code
+        discount = validated_data.pop('discount_code', None)
+        cart = validated_data.pop('cart', None)
+
+        # Take stock for every line at once before writing anything else,
+        # using whatever the shopper's cart already holds first
+        quantities = defaultdict(int)
+        for item in items_data:
+            quantities[item['product'].pk] += item['quantity']
+        to_decrement = consume_reservations(cart, quantities) if cart else quantities
+        try:
+            decrement_stock(to_decrement)
+        except InsufficientStock as exc:
+            # Report the failing lines in the same positions as the request
+            errors = []
+            for item in items_data:
+                product = item['product']
+                if product.pk in exc.shortages:
+                    available = exc.shortages[product.pk] + quantities[product.pk] - to_decrement[product.pk]
+                    errors.append({
+                        'quantity': f'Only {available} items available for {product.name}.'
+                    })
+                else:
+                    errors.append({})
+            raise serializers.ValidationError({'items': errors})
+
+        # djongo cannot roll the transaction back, so the stock taken above
+        # is returned by hand if the order is not written
+        try:
+            return self._create_order(validated_data, items_data, discount)
+        except BaseException:
+            restock(to_decrement)
+            raise
+
+    def _create_order(self, validated_data, items_data, discount):
         # Calculate order totals
         subtotal = sum(
             item['product'].price * item['quantity']
@@ -84,50 +128,101 @@ class OrderSerializer(serializers.ModelSerializer):
 
         # Apply discount if valid
         discount_amount = 0
-        if discount_code:
-            try:
-                discount = Discount.objects.get(code=discount_code)
-                if discount.is_valid and subtotal >= discount.min_purchase_amount:
-                    if discount.discount_type == 'percentage':
-                        discount_amount = subtotal * (discount.amount / 100)
-                    else:
-                        discount_amount = discount.amount
-
-                    if discount.max_discount_amount:
-                        discount_amount = min(discount_amount, discount.max_discount_amount)
-
-                    # Update discount usage
-                    discount.times_used += 1
-                    discount.save()
-            except Discount.DoesNotExist:
-                pass
+        if discount and discount.is_valid and subtotal >= discount.min_purchase_amount:
+            # Count the use atomically; another checkout may have
+            # taken the last redemption since validation
+            if not discount.redeem():
+                raise serializers.ValidationError({
+                    'discount_code': 'This discount code is no longer available.'
+                })
+            discount_amount = discount.get_discount_amount(subtotal)
 
         # Create order
         validated_data['subtotal'] = subtotal
         validated_data['discount_amount'] = discount_amount
         validated_data['total'] = subtotal - discount_amount + validated_data.get('shipping_cost', 0)
-        
-        if discount_code and discount_amount > 0:
+
+        if discount and discount_amount > 0:
             validated_data['discount'] = discount
 
         order = Order.objects.create(**validated_data)
 
-        # Create order items
-        for item_data in items_data:
-            product = item_data['product']
-            quantity = item_data['quantity']
-            
-            # Create order item
-            OrderItem.objects.create(
+        # bulk_create skips OrderItem.save, so the subtotal is set here
+        OrderItem.objects.bulk_create([
+            OrderItem(
                 order=order,
-                product=product,
-                quantity=quantity,
-                price=product.price,
-                subtotal=product.price * quantity
+                product=item['product'],
+                quantity=item['quantity'],
+                price=item['product'].price,
+                subtotal=item['product'].price * item['quantity']
             )
-
-            # Update product stock
-            product.stock -= quantity
-            product.save()
-
-        return order 
\ No newline at end of file
+            for item in items_data
+        ])
+
+        return order
+
+
+class OrderReadSerializer(ReadOnlySerializer):
+    """
+    Fast read-only equivalent of ``OrderSerializer`` for order lists and
+    detail responses. Item products collapse to their id when ``product``
+    is not expanded.
+    """
+    field_names = (
+        'id', 'order_number', 'user', 'status', 'payment_status',
+        'shipping_address', 'billing_address', 'phone_number', 'email',
+        'items', 'subtotal', 'shipping_cost', 'discount_amount', 'total',
+        'notes', 'tracking_number', 'estimated_delivery_date',
+        'status_history', 'created_at', 'updated_at'
+    )
+    money_fields = ('subtotal', 'shipping_cost', 'discount_amount', 'total')
+    date_fields = ('estimated_delivery_date',)
+    datetime_fields = ('created_at', 'updated_at')
+
+    @classmethod
+    def get_related_lookups(cls, fields=None, expand=None, prefix=''):
+        prefetch = []
+        if wants_field(fields, 'items'):
+            prefetch.append('items')
+            if is_expanded(expand, 'product'):
+                prefetch.append('items__product')
+                prefetch += ProductReadSerializer.get_related_lookups(
+                    expand=expand, prefix='items__product__'
+                )[1]
+        if wants_field(fields, 'status_history'):
+            prefetch.append('status_history')
+        return [], prefetch
+
+    @cached_property
+    def product_serializer(self):
+        return ProductReadSerializer(context=self.context, expand=self.expand)
+
+    def get_user(self, order):
+        return order.user_id
+
+    def get_items(self, order):
+        expanded = self.is_expanded('product')
+        return [
+            {
+                'id': item.id,
+                'product': (
+                    self.product_serializer.to_representation(item.product)
+                    if expanded else item.product_id
+                ),
+                'quantity': item.quantity,
+                'price': self.format_money(item.price),
+                'subtotal': self.format_money(item.subtotal),
+            }
+            for item in order.items.all()
+        ]
+
+    def get_status_history(self, order):
+        return [
+            {
+                'id': entry.id,
+                'status': entry.status,
+                'notes': entry.notes,
+                'created_at': self.format_datetime(entry.created_at),
+            }
+            for entry in order.status_history.all()
+        ]
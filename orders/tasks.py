@@ -1,8 +1,19 @@
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
 from celery import shared_task
-from django.core.mail import send_mail
 from django.conf import settings
-from django.template.loader import render_to_string
-from .models import Order
+from django.db import transaction
+from django.utils import timezone
+from ecommerce.utils import batched
+from .mail import build_order_confirmation_email, build_order_status_update_email, send_emails
+from .models import Order, OutboxEvent
+from .outbox import record_events
+from .realtime import push_order_status_updates
+from .transitions import UPDATED, transition_orders
+
+logger = logging.getLogger(__name__)
 
 @shared_task
 def send_order_confirmation_email(order_id):
@@ -11,21 +22,10 @@ def send_order_confirmation_email(order_id):
     """
     try:
         order = Order.objects.get(id=order_id)
-        subject = f'Order Confirmation - {order.order_number}'
-        message = render_to_string('orders/email/order_confirmation.html', {
-            'order': order
-        })
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [order.email],
-            html_message=message,
-            fail_silently=False,
-        )
+        send_emails([build_order_confirmation_email(order)])
         return True
-    except Exception as e:
-        print(f"Error sending order confirmation email: {str(e)}")
+    except Exception:
+        logger.exception('Error sending order confirmation email')
         return False
 
 @shared_task
@@ -35,21 +35,10 @@ def send_order_status_update_email(order_id):
     """
     try:
         order = Order.objects.get(id=order_id)
-        subject = f'Order Status Update - {order.order_number}'
-        message = render_to_string('orders/email/order_status_update.html', {
-            'order': order
-        })
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [order.email],
-            html_message=message,
-            fail_silently=False,
-        )
+        send_emails([build_order_status_update_email(order)])
         return True
-    except Exception as e:
-        print(f"Error sending order status update email: {str(e)}")
+    except Exception:
+        logger.exception('Error sending order status update email')
         return False
 
 @shared_task
@@ -61,35 +50,170 @@ def update_order_status(order_id, new_status, notes=''):
         order = Order.objects.get(id=order_id)
         old_status = order.status
         order.status = new_status
-        order.save()
+        with transaction.atomic():
+            # Only the update that actually flips the row to cancelled restocks
+            if new_status == 'cancelled':
+                flipped = Order.objects.filter(pk=order.pk).exclude(status='cancelled').update(status='cancelled')
+                if flipped:
+                    order.restock_items()
+            order.save()
 
-        # Create status history entry
-        order.status_history.create(
-            status=new_status,
-            notes=notes
-        )
+            # Create status history entry
+            order.status_history.create(
+                status=new_status,
+                notes=notes
+            )
+
+            # Queue the status update email with the change itself
+            if old_status != new_status:
+                record_events(OutboxEvent.ORDER_STATUS_CHANGED, [order.pk])
 
-        # Send status update email
-        if old_status != new_status:
-            send_order_status_update_email.delay(order_id)
-        
         return True
-    except Exception as e:
-        print(f"Error updating order status: {str(e)}")
+    except Exception:
+        logger.exception('Error updating order status')
         return False
 
 @shared_task
-def process_pending_orders():
+def send_order_confirmation_emails(order_ids):
     """
-    Process pending orders (can be extended based on business logic)
+    Send confirmation emails for a batch of orders in one SMTP batch
     """
     try:
-        pending_orders = Order.objects.filter(status='pending')
-        for order in pending_orders:
-            # Add your business logic here
-            # For example, check inventory, process payment, etc.
-            update_order_status.delay(order.id, 'processing', 'Order is being processed')
-        return True
-    except Exception as e:
-        print(f"Error processing pending orders: {str(e)}")
-        return False 
\ No newline at end of file
+        orders = Order.objects.filter(pk__in=order_ids)
+        return send_emails([build_order_confirmation_email(order) for order in orders])
+    except Exception:
+        logger.exception('Error sending order confirmation emails')
+        return 0
+
+@shared_task
+def send_order_status_update_emails(order_ids):
+    """
+    Send status update emails for a batch of orders in one SMTP batch
+    """
+    try:
+        orders = Order.objects.filter(pk__in=order_ids)
+        return send_emails([build_order_status_update_email(order) for order in orders])
+    except Exception:
+        logger.exception('Error sending order status update emails')
+        return 0
+
+@shared_task
+def push_order_status(order_ids):
+    """
+    Push the current status of a batch of orders to WebSocket subscribers
+    """
+    try:
+        return push_order_status_updates(order_ids)
+    except Exception:
+        logger.exception('Error pushing order status updates')
+        return 0
+
+def _process_pending_batch(order_ids):
+    start = time.monotonic()
+    results = transition_orders(order_ids, 'processing', 'Order is being processed')
+    updated = [order_id for order_id, result in results.items() if result == UPDATED]
+
+    elapsed = time.monotonic() - start
+    logger.info(
+        'Processed %d pending orders (%d moved to processing) in %.3fs, %.1f orders/s',
+        len(order_ids), len(updated), elapsed, len(order_ids) / elapsed if elapsed else 0
+    )
+    return len(updated)
+
+@shared_task
+def process_pending_orders(batch_size=500):
+    """
+    Move pending orders to processing in batches, with one status update,
+    one history insert and one outbox insert per batch
+    """
+    try:
+        processed = 0
+        pending_ids = (
+            Order.objects
+            .filter(status='pending')
+            .values_list('pk', flat=True)
+            .iterator(chunk_size=batch_size)
+        )
+        for batch in batched(pending_ids, batch_size):
+            processed += _process_pending_batch(batch)
+        return processed
+    except Exception:
+        logger.exception('Error processing pending orders')
+        return False
+
+
+# Handlers receive the order ids of every event of their type in a batch
+OUTBOX_EVENT_HANDLERS = {
+    OutboxEvent.ORDER_CREATED: (send_order_confirmation_emails, push_order_status),
+    OutboxEvent.ORDER_STATUS_CHANGED: (send_order_status_update_emails, push_order_status),
+}
+
+@shared_task
+def relay_outbox_events(batch_size=500):
+    """
+    Publish unpublished outbox events to their Celery handlers in batches.
+
+    Each batch is locked, published and marked in one transaction, so
+    concurrent relays never share events. A relay that dies after publishing
+    but before committing leaves its batch to be sent again (at least once).
+    """
+    try:
+        published = 0
+        while True:
+            with transaction.atomic():
+                events = list(
+                    OutboxEvent.objects
+                    .select_for_update(skip_locked=True)
+                    .filter(published_at__isnull=True)
+                    .values_list('pk', 'event_type', 'order_id')[:batch_size]
+                )
+                if not events:
+                    break
+
+                # djongo cannot roll back a failed checkout, so an event can
+                # outlive its order; those are marked without publishing
+                existing = set(
+                    Order.objects
+                    .filter(pk__in={order_id for _, _, order_id in events})
+                    .values_list('pk', flat=True)
+                )
+                order_ids = defaultdict(list)
+                for _, event_type, order_id in events:
+                    if order_id in existing:
+                        order_ids[event_type].append(order_id)
+                for event_type, ids in order_ids.items():
+                    for handler in OUTBOX_EVENT_HANDLERS[event_type]:
+                        handler.delay(ids)
+
+                OutboxEvent.objects.filter(pk__in=[pk for pk, _, _ in events]).update(
+                    published_at=timezone.now()
+                )
+            published += len(events)
+        return published
+    except Exception:
+        logger.exception('Error relaying outbox events')
+        return 0
+
+@shared_task
+def prune_outbox_events(batch_size=1000):
+    """
+    Delete outbox events published more than OUTBOX_RETENTION_HOURS ago,
+    in batches
+    """
+    try:
+        cutoff = timezone.now() - timedelta(hours=getattr(settings, 'OUTBOX_RETENTION_HOURS', 24))
+        pruned = 0
+        while True:
+            event_ids = list(
+                OutboxEvent.objects
+                .filter(published_at__lt=cutoff)
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not event_ids:
+                break
+            OutboxEvent.objects.filter(pk__in=event_ids).delete()
+            pruned += len(event_ids)
+        return pruned
+    except Exception:
+        logger.exception('Error pruning outbox events')
+        return 0
@@ -1,3 +1,342 @@
-from django.test import TestCase
+import threading
+import warnings
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from smtplib import SMTPServerDisconnected
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+from products.tests import LOCMEM_CACHES, create_catalogue, get_serializer_context, render
+from .mail import close_pooled_connection, get_email_template
+from .models import Order, OrderItem, OrderStatusHistory, OutboxEvent
+from .numbering import (
+    MAX_WORKER_ID, SEQUENCE_BITS, OrderNumberGenerator, allocate_worker_id
+)
+from .serializers import OrderReadSerializer, OrderSerializer
+from .tasks import (
+    push_order_status, relay_outbox_events, send_order_confirmation_emails,
+    send_order_status_update_emails
+)
+from .views import OrderViewSet
 
-# Create your tests here.
+EMAIL_TEMPLATES = [{
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'OPTIONS': {
+        'loaders': [('django.template.loaders.locmem.Loader', {
+            'orders/email/order_confirmation.html': 'Thank you for order {{ order.order_number }}',
+            'orders/email/order_status_update.html': 'Order {{ order.order_number }} is {{ order.status }}',
+        })],
+    },
+}]
+
+
+def create_order(user, products):
+    order = Order.objects.create(
+        user=user,
+        shipping_address='1 Main Street',
+        billing_address='1 Main Street',
+        phone_number='5550100',
+        email=user.email,
+        subtotal=Decimal('0.00'),
+        total=Decimal('0.00')
+    )
+    for product in products:
+        OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+    OrderStatusHistory.objects.create(order=order, status='pending', notes='Order placed')
+    return order
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrderQueryCountTests(TestCase):
+    """Related rows are batched, so the query count does not grow with the page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            email='shopper@example.com', username='shopper', password='password'
+        )
+        products = create_catalogue()
+        cls.orders = [create_order(cls.user, products) for _ in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+
+    def get(self, actions, url, **kwargs):
+        request = self.factory.get(url)
+        force_authenticate(request, user=self.user)
+        return OrderViewSet.as_view(actions)(request, **kwargs)
+
+    def test_list(self):
+        # Orders, then items, products, categories, images and status history
+        with self.assertNumQueries(6):
+            response = self.get({'get': 'list'}, '/api/orders/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), len(self.orders))
+
+    def test_retrieve(self):
+        order = self.orders[0]
+        with self.assertNumQueries(6):
+            response = self.get({'get': 'retrieve'}, f'/api/orders/{order.pk}/', pk=order.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['items']), 5)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrderReadSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(
+            email='shopper@example.com', username='shopper', password='password'
+        )
+        products = create_catalogue()
+        for _ in range(2):
+            create_order(user, products)
+
+    def test_matches_model_serializer(self):
+        orders = OrderSerializer.setup_eager_loading(Order.objects.order_by('pk'))
+        context = get_serializer_context()
+        self.assertEqual(
+            render(OrderReadSerializer(orders, many=True, context=context).data),
+            render(OrderSerializer(orders, many=True, context=context).data)
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BulkStatusTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser(
+            email='admin@example.com', username='admin', password='password'
+        )
+        products = create_catalogue(1)
+        cls.january = create_order(cls.admin, products)
+        cls.february = create_order(cls.admin, products)
+        cls.pending = create_order(cls.admin, products)
+        Order.objects.filter(pk__in=[cls.january.pk, cls.february.pk]).update(status='processing')
+        Order.objects.filter(pk=cls.january.pk).update(
+            created_at=datetime(2024, 1, 31, 23, 30, tzinfo=dt_timezone.utc)
+        )
+        Order.objects.filter(pk=cls.february.pk).update(
+            created_at=datetime(2024, 2, 1, 0, 30, tzinfo=dt_timezone.utc)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+
+    def post(self, data):
+        request = self.factory.post('/api/orders/bulk-update-status/', data, format='json')
+        force_authenticate(request, user=self.admin)
+        return OrderViewSet.as_view({'post': 'bulk_update_status'})(request)
+
+    def test_filtered_transition(self):
+        # Naive datetimes would only warn, so make them fail the test
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', RuntimeWarning)
+            response = self.post({
+                'status': 'shipped',
+                'notes': 'Left the warehouse',
+                'filter': {'status': 'processing', 'created_before': '2024-01-31'},
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['results'], [{'id': self.january.pk, 'result': 'updated'}])
+
+        statuses = dict(Order.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[self.january.pk], 'shipped')
+        self.assertEqual(statuses[self.february.pk], 'processing')
+        self.assertTrue(
+            OrderStatusHistory.objects.filter(
+                order=self.january, status='shipped', notes='Left the warehouse'
+            ).exists()
+        )
+        self.assertEqual(
+            list(OutboxEvent.objects.values_list('event_type', 'order_id')),
+            [(OutboxEvent.ORDER_STATUS_CHANGED, self.january.pk)]
+        )
+
+    def test_illegal_transitions_are_rejected(self):
+        response = self.post({
+            'status': 'shipped',
+            'order_ids': [self.february.pk, self.pending.pk, 0],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['results'], [
+            {'id': self.february.pk, 'result': 'updated'},
+            {'id': self.pending.pk, 'result': 'invalid_transition'},
+            {'id': 0, 'result': 'not_found'},
+        ])
+        self.pending.refresh_from_db()
+        self.assertEqual(self.pending.status, 'pending')
+
+    def test_invalid_filters_are_rejected(self):
+        for data in (
+            {'status': 'shipped', 'filter': {'created_after': '2024-13-01'}},
+            {'status': 'shipped', 'filter': {'region': 'north'}},
+            {'status': 'shipped', 'filter': {'status': ''}},
+            {'status': 'shipped', 'order_ids': '1,2'},
+        ):
+            with self.subTest(data):
+                self.assertEqual(self.post(data).status_code, 400)
+        self.assertFalse(Order.objects.filter(status='shipped').exists())
+
+
+class DisconnectOnceBackend(EmailBackend):
+    """Stand-in SMTP server that drops the connection before the second message."""
+    disconnected = False
+
+    def send_messages(self, messages):
+        if len(mail.outbox) == 1 and not DisconnectOnceBackend.disconnected:
+            DisconnectOnceBackend.disconnected = True
+            raise SMTPServerDisconnected('Connection unexpectedly closed')
+        return super().send_messages(messages)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    TEMPLATES=EMAIL_TEMPLATES,
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'
+)
+class OrderEmailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        products = create_catalogue(1)
+        cls.orders = []
+        for i in range(3):
+            user = get_user_model().objects.create_user(
+                email=f'shopper{i}@example.com', username=f'shopper{i}', password='password'
+            )
+            cls.orders.append(create_order(user, products))
+
+    def setUp(self):
+        # Connections are pooled per thread, so none may outlive a test
+        close_pooled_connection()
+        self.addCleanup(close_pooled_connection)
+        get_email_template.cache_clear()
+        DisconnectOnceBackend.disconnected = False
+
+    def test_sends_one_email_per_order(self):
+        sent = send_order_confirmation_emails([order.pk for order in self.orders])
+        self.assertEqual(sent, 3)
+        self.assertEqual(
+            sorted((message.to[0], message.subject) for message in mail.outbox),
+            [(order.email, f'Order Confirmation - {order.order_number}') for order in self.orders]
+        )
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+
+    @override_settings(EMAIL_BACKEND='orders.tests.DisconnectOnceBackend')
+    def test_disconnect_resends_only_the_undelivered_message(self):
+        sent = send_order_confirmation_emails([order.pk for order in self.orders])
+        self.assertTrue(DisconnectOnceBackend.disconnected)
+        self.assertEqual(sent, 3)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            [order.email for order in self.orders]
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            email='shopper@example.com', username='shopper', password='password'
+        )
+        cls.product = create_catalogue(1)[0]
+
+    def setUp(self):
+        cache.clear()
+        for task in (send_order_confirmation_emails, send_order_status_update_emails, push_order_status):
+            patcher = mock.patch.object(task, 'delay')
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def place_order(self):
+        request = APIRequestFactory().post('/api/orders/', {
+            'shipping_address': '1 Main Street',
+            'billing_address': '1 Main Street',
+            'phone_number': '5550100',
+            'email': self.user.email,
+            'items': [{'product_id': self.product.pk, 'quantity': 1}],
+        }, format='json')
+        force_authenticate(request, user=self.user)
+        response = OrderViewSet.as_view({'post': 'create'})(request)
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def test_event_is_written_with_the_order(self):
+        order_id = self.place_order()
+        self.assertEqual(
+            list(OutboxEvent.objects.values_list('order_id', 'event_type', 'published_at')),
+            [(order_id, OutboxEvent.ORDER_CREATED, None)]
+        )
+        # Broker I/O waits for the relay
+        send_order_confirmation_emails.delay.assert_not_called()
+
+    def test_relay_dispatches_and_marks_events(self):
+        order_ids = [self.place_order(), self.place_order()]
+        self.assertEqual(relay_outbox_events(), 2)
+
+        send_order_confirmation_emails.delay.assert_called_once_with(order_ids)
+        push_order_status.delay.assert_called_once_with(order_ids)
+        send_order_status_update_emails.delay.assert_not_called()
+        self.assertFalse(OutboxEvent.objects.filter(published_at__isnull=True).exists())
+
+        # Published events are not sent again
+        self.assertEqual(relay_outbox_events(), 0)
+        self.assertEqual(send_order_confirmation_emails.delay.call_count, 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ORDER_NUMBER_WORKER_ID=None)
+class OrderNumberTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_ids_are_unique_across_threads(self):
+        generator = OrderNumberGenerator()
+        buckets = [[] for _ in range(4)]
+
+        def run(bucket):
+            for _ in range(5000):
+                bucket.append(generator.next_order_number())
+
+        threads = [threading.Thread(target=run, args=(bucket,)) for bucket in buckets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        numbers = [number for bucket in buckets for number in bucket]
+        self.assertEqual(len(set(numbers)), len(numbers))
+
+    def test_ids_increase(self):
+        generator = OrderNumberGenerator()
+        # A frozen clock runs the sequence over into the next millisecond
+        with mock.patch('orders.numbering.time.time', return_value=1750000000.0):
+            ids = [generator.next_id() for _ in range(10000)]
+        self.assertEqual(ids, sorted(set(ids)))
+        # Fixed width numbers sort as text in the same order
+        numbers = [generator.next_order_number() for _ in range(100)]
+        self.assertEqual(numbers, sorted(numbers))
+
+    def test_processes_lease_distinct_worker_ids(self):
+        worker_ids = {allocate_worker_id().worker_id for _ in range(50)}
+        self.assertEqual(len(worker_ids), 50)
+
+    def test_configured_worker_id(self):
+        for worker_id in (0, MAX_WORKER_ID, str(MAX_WORKER_ID)):
+            with self.subTest(worker_id), override_settings(ORDER_NUMBER_WORKER_ID=worker_id):
+                generator = OrderNumberGenerator()
+                self.assertEqual(generator.next_id() >> SEQUENCE_BITS & MAX_WORKER_ID, int(worker_id))
+
+    def test_configured_worker_id_out_of_range(self):
+        for worker_id in (-1, MAX_WORKER_ID + 1, 'worker-1'):
+            with self.subTest(worker_id), override_settings(ORDER_NUMBER_WORKER_ID=worker_id):
+                with self.assertRaises(ImproperlyConfigured):
+                    allocate_worker_id()
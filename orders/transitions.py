@@ -0,0 +1,123 @@
+from datetime import datetime, time
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from products.inventory import restock
+from .models import Order, OrderItem, OrderStatusHistory, OutboxEvent
+from .outbox import record_events
+
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+NOT_FOUND = 'not_found'
+INVALID_TRANSITION = 'invalid_transition'
+
+TRANSITION_FILTER_KEYS = ('status', 'created_after', 'created_before')
+
+
+def transition_orders(order_ids, new_status, notes=''):
+    """
+    Move many orders to ``new_status`` with one UPDATE, one bulk history
+    insert and one bulk outbox insert for the notifications.
+
+    Orders whose current status cannot move to ``new_status`` according to
+    ``Order.STATUS_TRANSITIONS`` are left alone. Cancelling returns the items
+    of every cancelled order to stock in a single update. Returns ``{order_id: result}`` with one of
+    ``UPDATED``, ``UNCHANGED``, ``NOT_FOUND`` or ``INVALID_TRANSITION``.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    results = {}
+    with transaction.atomic():
+        current = dict(
+            Order.objects
+            .select_for_update()
+            .filter(pk__in=order_ids)
+            .values_list('pk', 'status')
+        )
+
+        to_update = []
+        for order_id in order_ids:
+            status = current.get(order_id)
+            if status is None:
+                results[order_id] = NOT_FOUND
+            elif status == new_status:
+                results[order_id] = UNCHANGED
+            elif new_status not in Order.STATUS_TRANSITIONS.get(status, ()):
+                results[order_id] = INVALID_TRANSITION
+            else:
+                results[order_id] = UPDATED
+                to_update.append(order_id)
+
+        if not to_update:
+            return results
+
+        Order.objects.filter(pk__in=to_update).update(status=new_status, updated_at=timezone.now())
+        OrderStatusHistory.objects.bulk_create([
+            OrderStatusHistory(order_id=order_id, status=new_status, notes=notes)
+            for order_id in to_update
+        ])
+        record_events(OutboxEvent.ORDER_STATUS_CHANGED, to_update)
+
+        if new_status == 'cancelled':
+            quantities = dict(
+                OrderItem.objects
+                .filter(order_id__in=to_update)
+                .values('product_id')
+                .annotate(quantity=Sum('quantity'))
+                .values_list('product_id', 'quantity')
+            )
+            restock(quantities)
+
+    return results
+
+
+def clean_transition_filters(filters):
+    """
+    Validate a filters dict for ``get_transition_queryset``, parsing the
+    dates into aware datetimes. A date stands for the start of that day in
+    ``created_after`` and its end in ``created_before``. Keys with empty
+    values are dropped. Raises ``ValueError`` with a message for the client
+    on unknown keys, a bad status or a bad date.
+    """
+    unknown = sorted(set(filters) - set(TRANSITION_FILTER_KEYS))
+    if unknown:
+        raise ValueError(f'Unknown filter keys: {", ".join(map(str, unknown))}')
+
+    cleaned = {key: value for key, value in filters.items() if value}
+    if 'status' in cleaned and cleaned['status'] not in dict(Order.STATUS_CHOICES):
+        raise ValueError('Invalid status')
+    for key, day_time in (('created_after', time.min), ('created_before', time.max)):
+        if key in cleaned:
+            cleaned[key] = parse_filter_datetime(key, cleaned[key], day_time)
+    return cleaned
+
+
+def parse_filter_datetime(key, value, day_time):
+    value = str(value)
+    try:
+        # parse_datetime also accepts a bare date, as midnight
+        day = parse_date(value)
+        parsed = datetime.combine(day, day_time) if day else parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f'{key} must be an ISO 8601 date or datetime')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def get_transition_queryset(filters):
+    """
+    Build the order queryset selected by a bulk transition ``filters`` dict
+    with optional ``status``, ``created_after`` and ``created_before`` keys,
+    as returned by ``clean_transition_filters``. Both bounds are inclusive.
+    """
+    queryset = Order.objects.all()
+    if filters.get('status'):
+        queryset = queryset.filter(status=filters['status'])
+    if filters.get('created_after'):
+        queryset = queryset.filter(created_at__gte=filters['created_after'])
+    if filters.get('created_before'):
+        queryset = queryset.filter(created_at__lte=filters['created_before'])
+    return queryset
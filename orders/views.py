@@ -1,44 +1,73 @@
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django.shortcuts import render
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from .models import Order, OrderItem
-from .serializers import OrderSerializer
-from .tasks import send_order_confirmation_email, update_order_status
+from ecommerce.pagination import KeysetPagination
+from ecommerce.utils import batched
+from ecommerce.views import SparseFieldsetMixin
+from .models import Order, OrderItem, OutboxEvent
+from .export import EXPORT_FORMATS, stream_orders
+from .outbox import record_events
+from .serializers import OrderSerializer, OrderReadSerializer
+from .tasks import update_order_status
+from .transitions import (
+    TRANSITION_FILTER_KEYS, UPDATED, clean_transition_filters, get_transition_queryset,
+    transition_orders
+)
 from cart.models import Cart
+from cart.reservations import release_reservations
+from cart.store import get_cart_store
 
-class OrderViewSet(viewsets.ModelViewSet):
+BULK_TRANSITION_BATCH_SIZE = 1000
+
+class OrderViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_serializer_class(self):
+        if self.action in ['list', 'retrieve', 'my_orders']:
+            return OrderReadSerializer
+        return OrderSerializer
 
     def get_queryset(self):
         user = self.request.user
-        if user.is_staff:
-            return Order.objects.all()
-        return Order.objects.filter(user=user)
+        queryset = Order.objects.all()
+        if not user.is_staff:
+            queryset = queryset.filter(user=user)
+        return self.setup_eager_loading(queryset)
 
     def get_permissions(self):
-        if self.action in ['update', 'partial_update', 'destroy']:
+        if self.action in ['update', 'partial_update', 'destroy', 'bulk_update_status', 'export']:
             return [permissions.IsAdminUser()]
         return [permissions.IsAuthenticated()]
 
     def perform_create(self, serializer):
-        order = serializer.save(user=self.request.user)
-        
-        # Send order confirmation email
-        send_order_confirmation_email.delay(order.id)
-
-        # Clear the user's cart if order was created from cart
+        # Orders placed from a cart use the stock the cart already holds
+        cart = None
         cart_id = self.request.data.get('cart_id')
         if cart_id:
-            try:
-                cart = Cart.objects.get(id=cart_id, user=self.request.user)
-                cart.items.all().delete()
+            cart = Cart.objects.filter(id=cart_id, user=self.request.user).first()
+
+        # The confirmation email is queued in the outbox with the order and
+        # published by relay_outbox_events, keeping broker I/O off checkout
+        with transaction.atomic():
+            order = serializer.save(user=self.request.user, cart=cart)
+            record_events(OutboxEvent.ORDER_CREATED, [order.pk])
+
+            # Clear the user's cart if order was created from cart
+            if cart is not None:
+                release_reservations(cart)
+                get_cart_store().clear(cart)
                 cart.discount = None
                 cart.save()
-            except Cart.DoesNotExist:
-                pass
+
+        # Serialize the response from a reload that batches items and history
+        serializer.instance = self.get_queryset().get(pk=order.pk)
 
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
@@ -69,10 +98,93 @@ class OrderViewSet(viewsets.ModelViewSet):
 
         return Response({'message': 'Status update initiated'})
 
+    @action(detail=False, methods=['post'], url_path='bulk-update-status')
+    def bulk_update_status(self, request):
+        new_status = request.data.get('status')
+        notes = request.data.get('notes', '')
+        order_ids = request.data.get('order_ids')
+        filters = request.data.get('filter')
+
+        if new_status not in dict(Order.STATUS_CHOICES):
+            return Response(
+                {'error': 'A valid status is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if order_ids is not None:
+            try:
+                if not isinstance(order_ids, list):
+                    raise TypeError
+                order_ids = [int(order_id) for order_id in order_ids]
+            except (TypeError, ValueError):
+                return Response(
+                    {'error': 'Order IDs must be a list of numbers'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        elif isinstance(filters, dict) and filters:
+            try:
+                filters = clean_transition_filters(filters)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            # An empty filter would select every order
+            if not filters:
+                return Response(
+                    {'error': f'Filter needs at least one of: {", ".join(TRANSITION_FILTER_KEYS)}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            order_ids = get_transition_queryset(filters).values_list('pk', flat=True).iterator(
+                chunk_size=BULK_TRANSITION_BATCH_SIZE
+            )
+        else:
+            return Response(
+                {'error': 'Either order_ids or filter is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = {}
+        for batch in batched(order_ids, BULK_TRANSITION_BATCH_SIZE):
+            results.update(transition_orders(batch, new_status, notes))
+
+        return Response({
+            'status': new_status,
+            'updated': sum(1 for result in results.values() if result == UPDATED),
+            'results': [
+                {'id': order_id, 'result': result}
+                for order_id, result in results.items()
+            ]
+        })
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        # ``format`` is taken by DRF's content negotiation
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f'export_format must be one of: {", ".join(EXPORT_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Filters are checked up front since errors cannot be reported once
+        # the response has started streaming
+        try:
+            filters = clean_transition_filters({
+                key: request.query_params.get(key) for key in TRANSITION_FILTER_KEYS
+            })
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(
+            stream_orders(get_transition_queryset(filters), export_format),
+            content_type=EXPORT_FORMATS[export_format]
+        )
+        filename = f'orders-{timezone.now():%Y%m%d%H%M%S}.{export_format}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
     @action(detail=True, methods=['get'])
     def status_history(self, request, pk=None):
         order = self.get_object()
-        history = order.status_history.all().order_by('-created_at')
+        history = order.status_history.all()
         data = [{
             'status': item.status,
             'notes': item.notes,
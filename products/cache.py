@@ -0,0 +1,139 @@
+import hashlib
+import math
+import random
+import time
+from django.core.cache import cache
+from .models import Discount, Product
+
+# Bump when the serialized product shape changes so old entries are ignored
+PRODUCT_CACHE_VERSION = 1
+PRODUCT_CACHE_TIMEOUT = 60 * 60
+PRODUCT_REFRESH_BETA = 1.0
+PRODUCT_LIST_CACHE_TIMEOUT = 60 * 10
+
+CATALOGUE_GENERATION_KEY = 'catalogue:generation'
+CATALOGUE_LAST_MODIFIED_KEY = 'catalogue:last_modified'
+
+DISCOUNT_CACHE_TIMEOUT = 60 * 5
+DISCOUNT_MISS_TIMEOUT = 60
+MISSING = '__missing__'
+
+
+def get_discount_cache_key(code):
+    return f'discount:{code}'
+
+
+def get_discount(code):
+    """
+    Read-through lookup of a discount by code, shared by every checkout step.
+
+    Unknown codes are cached briefly as well.
+    Raises ``Discount.DoesNotExist`` like ``Discount.objects.get``.
+    """
+    key = get_discount_cache_key(code)
+    discount = cache.get(key)
+    if discount == MISSING:
+        raise Discount.DoesNotExist(f'No discount with code {code!r}')
+    if discount is not None:
+        return discount
+
+    try:
+        discount = Discount.objects.get(code=code)
+    except Discount.DoesNotExist:
+        cache.set(key, MISSING, DISCOUNT_MISS_TIMEOUT)
+        raise
+
+    cache.set(key, discount, DISCOUNT_CACHE_TIMEOUT)
+    return discount
+
+
+def invalidate_discount(*codes):
+    cache.delete_many([get_discount_cache_key(code) for code in codes])
+
+
+def get_product_cache_key(slug):
+    return f'product:{slug}'
+
+
+def get_cached_product(slug, compute):
+    """
+    Return the cached detail payload for ``slug``, calling ``compute()`` on a
+    miss.
+
+    Entries are refreshed early with a probability that grows as they near
+    expiry (XFetch), weighted by how long ``compute()`` took, so a hot
+    product is rebuilt by one request instead of every request at once.
+    """
+    key = get_product_cache_key(slug)
+    entry = cache.get(key, version=PRODUCT_CACHE_VERSION)
+    if entry is not None:
+        data, delta, expires_at = entry
+        if time.time() - delta * PRODUCT_REFRESH_BETA * math.log(1 - random.random()) < expires_at:
+            return data
+
+    start = time.time()
+    data = compute()
+    delta = time.time() - start
+    cache.set(
+        key,
+        (data, delta, time.time() + PRODUCT_CACHE_TIMEOUT),
+        PRODUCT_CACHE_TIMEOUT,
+        version=PRODUCT_CACHE_VERSION
+    )
+    return data
+
+
+def invalidate_products(*slugs):
+    cache.delete_many(
+        [get_product_cache_key(slug) for slug in slugs],
+        version=PRODUCT_CACHE_VERSION
+    )
+    # Any product change can show up on any catalogue page
+    bump_catalogue_generation()
+
+
+def invalidate_product_ids(product_ids):
+    invalidate_products(*Product.objects.filter(pk__in=product_ids).values_list('slug', flat=True))
+
+
+def get_catalogue_state():
+    """
+    Return ``(generation, last_modified)`` for the catalogue. Every cached
+    list page is keyed by the generation, so bumping it retires them all.
+    """
+    generation = cache.get(CATALOGUE_GENERATION_KEY)
+    last_modified = cache.get(CATALOGUE_LAST_MODIFIED_KEY)
+    if generation is None or last_modified is None:
+        # Seed from the clock so a reset never reuses an older generation
+        now = time.time()
+        cache.add(CATALOGUE_GENERATION_KEY, int(now * 1000), None)
+        cache.add(CATALOGUE_LAST_MODIFIED_KEY, int(now), None)
+        generation = cache.get(CATALOGUE_GENERATION_KEY)
+        last_modified = cache.get(CATALOGUE_LAST_MODIFIED_KEY)
+    return generation, last_modified
+
+
+def bump_catalogue_generation():
+    try:
+        cache.incr(CATALOGUE_GENERATION_KEY)
+    except ValueError:
+        cache.add(CATALOGUE_GENERATION_KEY, int(time.time() * 1000), None)
+    cache.set(CATALOGUE_LAST_MODIFIED_KEY, int(time.time()), None)
+
+
+def get_product_list_fingerprint(request):
+    """
+    Hash the normalized query parameters and host of a list request, so
+    equivalent URLs share one cache entry and one ETag.
+    """
+    params = sorted(
+        (key, sorted(value for value in values if value))
+        for key, values in request.query_params.lists()
+    )
+    params = [(key, values) for key, values in params if values]
+    raw = repr((request.get_host(), request.accepted_renderer.format, params))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def get_product_list_cache_key(generation, fingerprint):
+    return f'products:list:{generation}:{fingerprint}'
@@ -0,0 +1,66 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from .models import Product
+from .realtime import get_stock_group_name, get_stock_message
+
+MAX_STOCK_SUBSCRIPTIONS = 100
+
+
+@database_sync_to_async
+def get_stock_levels(product_ids):
+    return list(Product.objects.filter(pk__in=product_ids).values_list('pk', 'stock'))
+
+
+class StockConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Streams stock levels for the products a client subscribes to with
+    ``{"action": "subscribe", "product_ids": [...]}`` (or ``unsubscribe``).
+    Current levels are sent on subscribe, then every change.
+    """
+
+    async def connect(self):
+        self.product_ids = set()
+        await self.accept()
+
+    async def disconnect(self, code):
+        for product_id in self.product_ids:
+            await self.channel_layer.group_discard(get_stock_group_name(product_id), self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        action = content.get('action') if isinstance(content, dict) else None
+        product_ids = content.get('product_ids') if isinstance(content, dict) else None
+        if action not in ('subscribe', 'unsubscribe'):
+            await self.send_json({'error': 'Action must be subscribe or unsubscribe'})
+            return
+
+        try:
+            product_ids = {int(product_id) for product_id in product_ids}
+        except (TypeError, ValueError):
+            await self.send_json({'error': 'product_ids must be a list of numbers'})
+            return
+
+        if action == 'unsubscribe':
+            for product_id in product_ids & self.product_ids:
+                await self.channel_layer.group_discard(get_stock_group_name(product_id), self.channel_name)
+            self.product_ids -= product_ids
+            return
+
+        new_ids = product_ids - self.product_ids
+        if len(self.product_ids) + len(new_ids) > MAX_STOCK_SUBSCRIPTIONS:
+            await self.send_json({'error': f'At most {MAX_STOCK_SUBSCRIPTIONS} products can be watched'})
+            return
+
+        for product_id in new_ids:
+            await self.channel_layer.group_add(get_stock_group_name(product_id), self.channel_name)
+        self.product_ids |= new_ids
+
+        for product_id, stock in await get_stock_levels(new_ids):
+            await self.stock_update(get_stock_message(product_id, stock))
+
+    async def stock_update(self, event):
+        await self.send_json({
+            'type': 'stock',
+            'product_id': event['product_id'],
+            'stock': event['stock'],
+            'in_stock': event['in_stock'],
+        })
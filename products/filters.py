@@ -1,5 +1,6 @@
 import django_filters
 from .models import Product
+from .search import search_product_ids
 from django.db import models
 
 class ProductFilter(django_filters.FilterSet):
@@ -14,7 +15,18 @@ class ProductFilter(django_filters.FilterSet):
         fields = ['min_price', 'max_price', 'category', 'in_stock']
 
     def filter_search(self, queryset, name, value):
-        return queryset.filter(
-            models.Q(name__icontains=value) |
-            models.Q(description__icontains=value)
-        ) 
\ No newline at end of file
+        product_ids = search_product_ids(value)
+        if product_ids is None:
+            # No text index on this database, fall back to a substring scan
+            return queryset.filter(
+                models.Q(name__icontains=value) |
+                models.Q(description__icontains=value)
+            )
+
+        if not product_ids:
+            return queryset.none()
+
+        # djongo cannot order by a CASE expression, so ProductViewSet pages
+        # through these ids in relevance order unless an ordering is given
+        self.request.search_ranking = product_ids
+        return queryset.filter(pk__in=product_ids)
@@ -0,0 +1,358 @@
+"""
+Bulk catalogue import.
+
+A feed is a CSV file or JSON lines file with one product per record. The
+columns are ``name``, ``price``, ``category`` (name) and optionally
+``slug``, ``description``, ``stock``, ``is_active``, ``category_slug`` and
+``images`` (storage paths, ``|`` separated in CSV or a list in JSONL).
+
+Records are read as a stream and applied in batches. Each batch loads the
+categories and products it refers to in one query each, creates what is
+missing with ``bulk_create`` and writes only the changed fields of existing
+products with ``bulk_update``. Products are matched by slug. A slug that
+appears twice in the same feed is rejected after its first record.
+
+The feed's ``stock`` is the quantity on hand. ``Product.stock`` only counts
+stock not held by cart reservations, so what carts currently hold is
+subtracted before it is written.
+"""
+import csv
+import json
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+from ecommerce.utils import batched
+from cart.models import StockReservation
+from .cache import invalidate_products
+from .models import Category, Product, ProductImage
+from .realtime import mark_stock_changed
+
+IMPORT_BATCH_SIZE = 1000
+
+CSV = 'csv'
+JSONL = 'jsonl'
+FEED_FORMATS = (CSV, JSONL)
+
+PRODUCT_UPDATE_FIELDS = ('name', 'description', 'price', 'stock', 'is_active', 'category_id')
+MAX_PRICE = Decimal('100000000')
+TRUE_VALUES = ('1', 'true', 'yes', 'y')
+
+
+class RejectedRecord(Exception):
+    pass
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.categories_created = 0
+        self.images_created = 0
+        self.rejected = []
+        self.started_at = time.monotonic()
+        self.elapsed = 0.0
+
+    @property
+    def processed(self):
+        return self.created + self.updated + self.unchanged + len(self.rejected)
+
+    @property
+    def rate(self):
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    def reject(self, record_number, reason):
+        self.rejected.append({'record': record_number, 'error': reason})
+
+    def finish(self):
+        self.elapsed = time.monotonic() - self.started_at
+
+    def as_dict(self):
+        return {
+            'processed': self.processed,
+            'created': self.created,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'categories_created': self.categories_created,
+            'images_created': self.images_created,
+            'rejected': self.rejected,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'records_per_second': round(self.rate, 1),
+        }
+
+
+def get_feed_format(filename, default=CSV):
+    if filename and filename.lower().endswith(('.jsonl', '.ndjson')):
+        return JSONL
+    if filename and filename.lower().endswith('.csv'):
+        return CSV
+    return default
+
+
+def iter_records(stream, feed_format):
+    """Yield raw records from a text stream without loading it whole."""
+    if feed_format == CSV:
+        yield from csv.DictReader(stream)
+        return
+
+    # Lines are decoded in clean_record so a bad line is rejected on its own
+    for line in stream:
+        if line.strip():
+            yield line
+
+
+def clean_record(record):
+    """Validate a raw record and normalize it to model values."""
+    if isinstance(record, str):
+        try:
+            record = json.loads(record)
+        except ValueError as e:
+            raise RejectedRecord(f'Invalid JSON: {e}')
+    if not isinstance(record, dict):
+        raise RejectedRecord('Record must be an object')
+
+    name = str(record.get('name') or '').strip()
+    if not name:
+        raise RejectedRecord('name is required')
+    if len(name) > 200:
+        raise RejectedRecord('name is longer than 200 characters')
+
+    slug = slugify(record.get('slug') or name)
+    if not slug:
+        raise RejectedRecord('slug is empty')
+    if len(slug) > 200:
+        raise RejectedRecord('slug is longer than 200 characters')
+
+    try:
+        price = Decimal(str(record.get('price')).strip())
+    except InvalidOperation:
+        raise RejectedRecord('price must be a number')
+    if not price.is_finite() or price < 0 or price >= MAX_PRICE or price.as_tuple().exponent < -2:
+        raise RejectedRecord('price must be between 0 and 99999999.99 with at most 2 decimal places')
+
+    stock = record.get('stock')
+    try:
+        stock = int(stock) if stock not in (None, '') else 0
+    except (TypeError, ValueError):
+        raise RejectedRecord('stock must be a whole number')
+    if stock < 0:
+        raise RejectedRecord('stock cannot be negative')
+
+    is_active = record.get('is_active')
+    if is_active in (None, ''):
+        is_active = True
+    elif not isinstance(is_active, bool):
+        is_active = str(is_active).strip().lower() in TRUE_VALUES
+
+    category_name = str(record.get('category') or '').strip()
+    if not category_name:
+        raise RejectedRecord('category is required')
+    if len(category_name) > 100:
+        raise RejectedRecord('category is longer than 100 characters')
+    category_slug = slugify(record.get('category_slug') or category_name)
+    if not category_slug:
+        raise RejectedRecord('category slug is empty')
+
+    images = record.get('images') or []
+    if isinstance(images, str):
+        images = images.split('|')
+    images = [str(image).strip() for image in images if str(image).strip()]
+
+    return {
+        'slug': slug,
+        'name': name,
+        'description': str(record.get('description') or ''),
+        'price': price,
+        'stock': stock,
+        'is_active': is_active,
+        'category_name': category_name,
+        'category_slug': category_slug,
+        'images': images,
+    }
+
+
+class CatalogueImporter:
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.report = ImportReport()
+        self.category_ids = {}
+        self.seen_slugs = {}
+
+    def run(self, records):
+        numbered = enumerate(records, start=1)
+        for batch in batched(numbered, self.batch_size):
+            rows = self.clean_batch(batch)
+            if rows:
+                self.import_batch(rows)
+            if self.progress is not None:
+                self.report.finish()
+                self.progress(self.report)
+        self.report.finish()
+        return self.report
+
+    def clean_batch(self, batch):
+        rows = []
+        for record_number, record in batch:
+            try:
+                row = clean_record(record)
+            except RejectedRecord as e:
+                self.report.reject(record_number, str(e))
+                continue
+
+            first_seen = self.seen_slugs.setdefault(row['slug'], record_number)
+            if first_seen != record_number:
+                self.report.reject(
+                    record_number,
+                    f'Duplicate slug {row["slug"]} (first seen in record {first_seen})'
+                )
+                continue
+            rows.append(row)
+        return rows
+
+    def import_batch(self, rows):
+        with transaction.atomic():
+            self.resolve_categories(rows)
+            changed_slugs, product_ids = self.upsert_products(rows)
+            changed_slugs.update(self.create_images(rows, product_ids))
+            if changed_slugs:
+                changed_ids = [product_ids[slug] for slug in changed_slugs]
+                # bulk writes skip the model signals that normally do this
+                transaction.on_commit(lambda: invalidate_products(*changed_slugs))
+                transaction.on_commit(lambda: mark_stock_changed(changed_ids))
+
+    def resolve_categories(self, rows):
+        missing = {
+            row['category_slug']: row['category_name']
+            for row in rows
+            if row['category_slug'] not in self.category_ids
+        }
+        if not missing:
+            return
+
+        existing = Category.objects.filter(
+            Q(slug__in=missing) | Q(name__in=missing.values())
+        ).values_list('id', 'slug', 'name')
+        by_name = {}
+        for category_id, slug, name in existing:
+            self.category_ids[slug] = category_id
+            by_name[name] = category_id
+
+        # Names are unique too, so a name listed under several slugs in the
+        # feed maps every slug to the one category
+        unresolved = {slug: name for slug, name in missing.items() if slug not in self.category_ids}
+        to_create = {}
+        for slug, name in unresolved.items():
+            if name not in by_name and name not in to_create:
+                to_create[name] = Category(name=name, slug=slug)
+
+        if to_create:
+            Category.objects.bulk_create(to_create.values(), batch_size=self.batch_size)
+            self.report.categories_created += len(to_create)
+            by_name.update(Category.objects.filter(name__in=to_create).values_list('name', 'id'))
+
+        for slug, name in unresolved.items():
+            self.category_ids[slug] = by_name[name]
+
+    def upsert_products(self, rows):
+        slugs = [row['slug'] for row in rows]
+        existing = Product.objects.filter(slug__in=slugs).only('id', 'slug', *PRODUCT_UPDATE_FIELDS).in_bulk(
+            field_name='slug'
+        )
+
+        # Held stock goes back to Product.stock when the reservation ends
+        reserved = defaultdict(int)
+        for product_id, quantity in StockReservation.objects.filter(
+            product_id__in=[product.id for product in existing.values()]
+        ).values_list('product_id', 'quantity'):
+            reserved[product_id] += quantity
+
+        now = timezone.now()
+        to_create = []
+        to_update = []
+        update_fields = set()
+        for row in rows:
+            values = {
+                'name': row['name'],
+                'description': row['description'],
+                'price': row['price'],
+                'stock': row['stock'],
+                'is_active': row['is_active'],
+                'category_id': self.category_ids[row['category_slug']],
+            }
+            product = existing.get(row['slug'])
+            if product is None:
+                to_create.append(Product(slug=row['slug'], **values))
+                continue
+            values['stock'] = max(row['stock'] - reserved[product.id], 0)
+
+            changed = [field for field, value in values.items() if getattr(product, field) != value]
+            if not changed:
+                self.report.unchanged += 1
+                continue
+            for field in changed:
+                setattr(product, field, values[field])
+            product.updated_at = now
+            update_fields.update(changed)
+            to_update.append(product)
+
+        if to_create:
+            Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+            self.report.created += len(to_create)
+        if to_update:
+            Product.objects.bulk_update(
+                to_update, [*sorted(update_fields), 'updated_at'], batch_size=self.batch_size
+            )
+            self.report.updated += len(to_update)
+
+        product_ids = {slug: product.id for slug, product in existing.items()}
+        if to_create:
+            # Primary keys are not returned by bulk_create on every backend
+            product_ids.update(
+                Product.objects
+                .filter(slug__in=[product.slug for product in to_create])
+                .values_list('slug', 'id')
+            )
+
+        changed_slugs = {product.slug for product in to_create + to_update}
+        return changed_slugs, product_ids
+
+    def create_images(self, rows, product_ids):
+        """Add feed images a product does not have yet. Returns the slugs touched."""
+        slugs = {product_ids[row['slug']]: row['slug'] for row in rows if row['images']}
+        wanted = {product_ids[row['slug']]: row['images'] for row in rows if row['images']}
+        if not wanted:
+            return set()
+
+        existing = {}
+        for product_id, image in ProductImage.objects.filter(product_id__in=wanted).values_list(
+            'product_id', 'image'
+        ):
+            existing.setdefault(product_id, set()).add(image)
+
+        to_create = []
+        for product_id, images in wanted.items():
+            current = existing.get(product_id, set())
+            has_primary = bool(current)
+            for image in dict.fromkeys(images):
+                if image in current:
+                    continue
+                to_create.append(ProductImage(product_id=product_id, image=image, is_primary=not has_primary))
+                has_primary = True
+
+        if to_create:
+            ProductImage.objects.bulk_create(to_create, batch_size=self.batch_size)
+            self.report.images_created += len(to_create)
+        return {slugs[image.product_id] for image in to_create}
+
+
+def import_catalogue(stream, feed_format, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    Import a text ``stream`` in ``feed_format`` and return the ImportReport.
+    ``progress`` is called with the report after every batch.
+    """
+    return CatalogueImporter(batch_size, progress).run(iter_records(stream, feed_format))
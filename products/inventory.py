@@ -0,0 +1,145 @@
+from uuid import uuid4
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+from pymongo import UpdateOne
+from ecommerce.utils import get_collection, uses_mongo
+from .models import Product
+from .cache import invalidate_product_ids
+from .realtime import mark_stock_changed
+
+# Array on product documents tagging the checkouts that decremented them,
+# so a partially applied bulk write can be undone
+STOCK_HOLDS_FIELD = 'stock_holds'
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when one or more products cannot cover the requested quantity.
+    ``shortages`` maps each failing product id to the stock still available.
+    """
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__(f'Insufficient stock for products {sorted(shortages)}')
+
+
+def decrement_stock(quantities):
+    """
+    Decrement stock for ``{product_id: quantity}`` in one conditional bulk
+    update. Either every product is decremented or none is.
+    """
+    if not quantities:
+        return
+
+    decrement = _decrement_documents if uses_mongo() else _decrement_rows
+    if not decrement(quantities):
+        available = dict(
+            Product.objects.filter(pk__in=quantities).values_list('pk', 'stock')
+        )
+        raise InsufficientStock({
+            product_id: available.get(product_id, 0)
+            for product_id, quantity in quantities.items()
+            if available.get(product_id, 0) < quantity
+        })
+
+    transaction.on_commit(lambda: invalidate_product_ids(list(quantities)))
+    transaction.on_commit(lambda: mark_stock_changed(list(quantities)))
+
+
+def _decrement_rows(quantities):
+    conditions = Q()
+    whens = []
+    for product_id, quantity in quantities.items():
+        conditions |= Q(pk=product_id, stock__gte=quantity)
+        whens.append(When(pk=product_id, then=F('stock') - quantity))
+
+    with transaction.atomic():
+        updated = Product.objects.filter(conditions).update(
+            stock=Case(*whens, default=F('stock'), output_field=Product._meta.get_field('stock')),
+            updated_at=timezone.now()
+        )
+        if updated != len(quantities):
+            transaction.set_rollback(True)
+            return False
+    return True
+
+
+def _decrement_documents(quantities):
+    """
+    djongo cannot translate ``F()`` or ``Case``, and cannot roll back, so
+    the products are decremented with one unordered pymongo bulk write of
+    ``$inc`` updates guarded by ``stock >= quantity``. Every update tags its
+    product with a token; when a line falls short, the tagged products are
+    the ones to put back.
+    """
+    collection = get_collection(Product)
+    token = uuid4().hex
+    now = timezone.now()
+    try:
+        result = collection.bulk_write([
+            UpdateOne(
+                {'id': product_id, 'stock': {'$gte': quantity}},
+                {
+                    '$inc': {'stock': -quantity},
+                    '$set': {'updated_at': now},
+                    '$addToSet': {STOCK_HOLDS_FIELD: token},
+                }
+            )
+            for product_id, quantity in quantities.items()
+        ], ordered=False)
+        applied = result.matched_count == len(quantities)
+    except BaseException:
+        _undo_decrement(collection, token, quantities)
+        raise
+
+    if applied:
+        collection.update_many({STOCK_HOLDS_FIELD: token}, {'$pull': {STOCK_HOLDS_FIELD: token}})
+    else:
+        _undo_decrement(collection, token, quantities)
+    return applied
+
+
+def _undo_decrement(collection, token, quantities):
+    taken = [
+        document['id']
+        for document in collection.find({STOCK_HOLDS_FIELD: token}, {'_id': 0, 'id': 1})
+    ]
+    if taken:
+        collection.bulk_write([
+            UpdateOne(
+                {'id': product_id, STOCK_HOLDS_FIELD: token},
+                {'$inc': {'stock': quantities[product_id]}, '$pull': {STOCK_HOLDS_FIELD: token}}
+            )
+            for product_id in taken
+        ], ordered=False)
+
+
+def restock(quantities):
+    """
+    Return ``{product_id: quantity}`` to stock in one bulk update.
+    """
+    quantities = {
+        product_id: quantity
+        for product_id, quantity in quantities.items()
+        if quantity > 0
+    }
+    if not quantities:
+        return
+
+    if uses_mongo():
+        now = timezone.now()
+        get_collection(Product).bulk_write([
+            UpdateOne({'id': product_id}, {'$inc': {'stock': quantity}, '$set': {'updated_at': now}})
+            for product_id, quantity in quantities.items()
+        ], ordered=False)
+    else:
+        Product.objects.filter(pk__in=quantities).update(
+            stock=Case(
+                *(When(pk=product_id, then=F('stock') + quantity) for product_id, quantity in quantities.items()),
+                default=F('stock'),
+                output_field=Product._meta.get_field('stock')
+            ),
+            updated_at=timezone.now()
+        )
+    transaction.on_commit(lambda: invalidate_product_ids(list(quantities)))
+    transaction.on_commit(lambda: mark_stock_changed(list(quantities)))
@@ -0,0 +1,55 @@
+import timeit
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from cart.models import Cart
+from cart.serializers import CartReadSerializer, CartSerializer
+from orders.models import Order
+from orders.serializers import OrderReadSerializer, OrderSerializer
+from products.models import Product
+from products.serializers import ProductReadSerializer, ProductSerializer
+
+BENCHMARKS = (
+    ('products', Product, ProductSerializer, ProductReadSerializer),
+    ('carts', Cart, CartSerializer, CartReadSerializer),
+    ('orders', Order, OrderSerializer, OrderReadSerializer),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the fast read serializers with the ModelSerializers they replace '
+        'on existing rows: same output, and time per object'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help='Rows of each model to serialize')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # Without a request both serializers render relative file URLs, so
+        # no host has to be allowed
+        context = {}
+        for name, model, model_serializer, read_serializer in BENCHMARKS:
+            # Rows are loaded once so only serialization is timed
+            instances = list(model_serializer.setup_eager_loading(model.objects.order_by('pk'))[:options['limit']])
+            if not instances:
+                self.stdout.write(f'{name}: no rows to serialize')
+                continue
+
+            def run(serializer_class):
+                return serializer_class(instances, many=True, context=context).data
+
+            renderer = JSONRenderer()
+            if renderer.render(run(read_serializer)) != renderer.render(run(model_serializer)):
+                self.stderr.write(self.style.ERROR(f'{name}: read serializer output differs'))
+
+            timings = {}
+            for serializer_class in (model_serializer, read_serializer):
+                seconds = min(timeit.repeat(lambda: run(serializer_class), number=1, repeat=options['repeat']))
+                timings[serializer_class] = seconds / len(instances) * 1e6
+            self.stdout.write(
+                f'{name} ({len(instances)} rows): {model_serializer.__name__} '
+                f'{timings[model_serializer]:.1f}us/object, {read_serializer.__name__} '
+                f'{timings[read_serializer]:.1f}us/object '
+                f'({timings[model_serializer] / timings[read_serializer]:.1f}x faster)'
+            )
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from products.search import SEARCH_INDEX_NAME, ensure_search_index
+
+
+class Command(BaseCommand):
+    help = 'Create the MongoDB text index used by product search'
+
+    def handle(self, *args, **options):
+        ensure_search_index()
+        self.stdout.write(self.style.SUCCESS(f'Search index {SEARCH_INDEX_NAME} is ready'))
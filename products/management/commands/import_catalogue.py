@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from products.importer import FEED_FORMATS, IMPORT_BATCH_SIZE, get_feed_format, import_catalogue
+
+
+class Command(BaseCommand):
+    help = 'Import products, categories and images from a CSV or JSON lines feed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Feed file to import')
+        parser.add_argument('--feed-format', choices=FEED_FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        feed_format = options['feed_format'] or get_feed_format(path)
+
+        def progress(report):
+            self.stdout.write(
+                f'{report.processed} records, {report.rate:.0f}/s '
+                f'({report.created} created, {report.updated} updated, '
+                f'{report.unchanged} unchanged, {len(report.rejected)} rejected)'
+            )
+
+        try:
+            with open(path, encoding='utf-8', newline='') as stream:
+                report = import_catalogue(stream, feed_format, options['batch_size'], progress)
+        except OSError as e:
+            raise CommandError(f'Could not read {path}: {e}')
+
+        for rejected in report.rejected:
+            self.stderr.write(f'Record {rejected["record"]}: {rejected["error"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {report.processed} records in {report.elapsed:.1f}s '
+            f'({report.rate:.0f}/s): {report.created} created, {report.updated} updated, '
+            f'{report.unchanged} unchanged, {report.categories_created} categories and '
+            f'{report.images_created} images created, {len(report.rejected)} rejected'
+        ))
@@ -103,3 +103,74 @@ class Discount(models.Model):
             self.end_date >= now and
             (self.usage_limit == 0 or self.times_used < self.usage_limit)
         )
+
+    def redeem(self):
+        """
+        Count one use of this discount with a single conditional increment,
+        so concurrent checkouts cannot push it past ``usage_limit``. Returns
+        False when the discount could not be redeemed.
+        """
+        from django.utils import timezone
+        from ecommerce.utils import uses_mongo
+        now = timezone.now()
+        redeem = self._redeem_document if uses_mongo() else self._redeem_row
+        counts = redeem(now)
+        if counts is None:
+            return False
+
+        self.times_used, usage_limit = counts
+        if usage_limit and self.times_used >= usage_limit:
+            # Cached copies are only dropped once they stop being valid, so
+            # the hottest codes stay cached while they can still be used
+            from .cache import invalidate_discount
+            invalidate_discount(self.code)
+        return True
+
+    def _redeem_row(self, now):
+        redeemable = Discount.objects.filter(
+            pk=self.pk,
+            is_active=True,
+            start_date__lte=now,
+            end_date__gte=now
+        )
+        updated = redeemable.filter(
+            models.Q(usage_limit=0) | models.Q(times_used__lt=models.F('usage_limit'))
+        ).update(times_used=models.F('times_used') + 1)
+        if not updated:
+            return None
+        return Discount.objects.filter(pk=self.pk).values_list('times_used', 'usage_limit').get()
+
+    def _redeem_document(self, now):
+        # djongo cannot translate F() arithmetic, so the increment and its
+        # guard go to MongoDB as one find_one_and_update
+        from pymongo import ReturnDocument
+        from ecommerce.utils import get_collection
+        document = get_collection(Discount).find_one_and_update(
+            {
+                'id': self.pk,
+                'is_active': True,
+                'start_date': {'$lte': now},
+                'end_date': {'$gte': now},
+                '$or': [
+                    {'usage_limit': 0},
+                    {'$expr': {'$lt': ['$times_used', '$usage_limit']}},
+                ],
+            },
+            {'$inc': {'times_used': 1}},
+            projection={'_id': 0, 'times_used': 1, 'usage_limit': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if document is None:
+            return None
+        return document['times_used'], document['usage_limit']
+
+    def get_discount_amount(self, subtotal):
+        if self.discount_type == 'percentage':
+            discount_amount = subtotal * (self.amount / 100)
+        else:
+            discount_amount = self.amount
+
+        if self.max_discount_amount:
+            discount_amount = min(discount_amount, self.max_discount_amount)
+
+        return discount_amount
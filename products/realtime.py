@@ -0,0 +1,68 @@
+"""
+Stock level push.
+
+Stock changes only mark the product as changed. ``push_stock_updates``
+(run by Celery beat every second) then sends each changed product's current
+stock once, so a burst of reservations and orders on a popular product
+becomes a single message per interval.
+"""
+import logging
+from ecommerce.realtime import group_send_many
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+STOCK_CHANGED_KEY = 'realtime:stock:changed'
+
+
+def get_redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+def get_stock_group_name(product_id):
+    return f'product_stock_{product_id}'
+
+
+def get_stock_message(product_id, stock):
+    return {
+        'type': 'stock.update',
+        'product_id': product_id,
+        'stock': stock,
+        'in_stock': stock > 0,
+    }
+
+
+def mark_stock_changed(product_ids):
+    # Runs after commit on the request path, where a failure must not fail
+    # the request. Without a django_redis cache there is no stock push.
+    if not product_ids:
+        return
+    try:
+        redis = get_redis()
+    except NotImplementedError:
+        return
+    try:
+        redis.sadd(STOCK_CHANGED_KEY, *product_ids)
+    except Exception:
+        logger.debug('Could not mark stock changes for products %s', product_ids, exc_info=True)
+
+
+def push_stock_updates(batch_size=500):
+    """
+    Send the current stock of every product changed since the last run to
+    its subscribers. Returns the number of products pushed.
+    """
+    redis = get_redis()
+    pushed = 0
+    while True:
+        product_ids = [int(product_id) for product_id in redis.spop(STOCK_CHANGED_KEY, batch_size) or []]
+        if not product_ids:
+            return pushed
+
+        stock = Product.objects.filter(pk__in=product_ids).values_list('pk', 'stock')
+        group_send_many([
+            (get_stock_group_name(product_id), get_stock_message(product_id, quantity))
+            for product_id, quantity in stock
+        ])
+        pushed += len(product_ids)
@@ -0,0 +1,54 @@
+from pymongo import TEXT
+from pymongo.errors import OperationFailure
+from ecommerce.utils import get_collection, uses_mongo
+from .models import Product
+
+SEARCH_INDEX_NAME = 'product_text_search'
+# Matches past this many are not worth paging through and would only
+# lengthen the id list sent back with every query
+SEARCH_CANDIDATE_LIMIT = 1000
+
+_index_ready = False
+
+
+def get_product_collection():
+    return get_collection(Product)
+
+
+def ensure_search_index():
+    """
+    Create the MongoDB text index over product names and descriptions.
+    MongoDB keeps it in sync with every write, so no signals are needed.
+    """
+    global _index_ready
+    get_product_collection().create_index(
+        [('name', TEXT), ('description', TEXT)],
+        weights={'name': 10, 'description': 1},
+        default_language='english',
+        name=SEARCH_INDEX_NAME
+    )
+    _index_ready = True
+
+
+def search_product_ids(query):
+    """
+    Return the ids of the ``SEARCH_CANDIDATE_LIMIT`` products that best
+    match ``query``, most relevant first, or None when the text index is not
+    available on this database. Only ids are read, so the other filters and
+    pagination apply to every candidate.
+    """
+    if not uses_mongo():
+        return None
+
+    try:
+        if not _index_ready:
+            ensure_search_index()
+        cursor = (
+            get_product_collection()
+            .find({'$text': {'$search': query}}, {'_id': 0, 'id': 1, 'score': {'$meta': 'textScore'}})
+            .sort([('score', {'$meta': 'textScore'})])
+            .limit(SEARCH_CANDIDATE_LIMIT)
+        )
+        return [document['id'] for document in cursor]
+    except OperationFailure:
+        return None
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from ecommerce.serializers import EagerLoadingMixin, ReadOnlySerializer, is_expanded, wants_field
 from .models import Category, Product, ProductImage, Discount
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -11,7 +12,10 @@ class ProductImageSerializer(serializers.ModelSerializer):
         model = ProductImage
         fields = ('id', 'image', 'is_primary')
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ('category',)
+    prefetch_related_fields = ('images',)
+
     category = CategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all(),
@@ -64,7 +68,55 @@ class ProductSerializer(serializers.ModelSerializer):
 
         return instance
 
-class DiscountSerializer(serializers.ModelSerializer):
+class ProductReadSerializer(ReadOnlySerializer):
+    """
+    Fast read-only equivalent of ``ProductSerializer`` for list and detail
+    responses. ``category`` collapses to its id and ``images`` is left out
+    when not expanded.
+    """
+    field_names = (
+        'id', 'name', 'slug', 'description', 'price', 'category', 'stock',
+        'is_active', 'images', 'created_at', 'updated_at'
+    )
+    money_fields = ('price',)
+    datetime_fields = ('created_at', 'updated_at')
+    collapsed_fields = {'category': 'category_id', 'images': None}
+
+    @classmethod
+    def get_related_lookups(cls, fields=None, expand=None, prefix=''):
+        select, prefetch = [], []
+        if wants_field(fields, 'category') and is_expanded(expand, 'category'):
+            # Nested products are reached through a reverse relation, so
+            # their category can only be prefetched
+            (prefetch if prefix else select).append(f'{prefix}category')
+        if wants_field(fields, 'images') and is_expanded(expand, 'images'):
+            prefetch.append(f'{prefix}images')
+        return select, prefetch
+
+    def get_category(self, product):
+        category = product.category
+        return {
+            'id': category.id,
+            'name': category.name,
+            'slug': category.slug,
+            'description': category.description,
+            'image': self.format_file(category.image),
+            'parent': category.parent_id,
+        }
+
+    def get_images(self, product):
+        return [
+            {
+                'id': image.id,
+                'image': self.format_file(image.image),
+                'is_primary': image.is_primary,
+            }
+            for image in product.images.all()
+        ]
+
+class DiscountSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    prefetch_related_fields = ('products__category', 'products__images', 'categories')
+
     products = ProductSerializer(many=True, read_only=True)
     product_ids = serializers.PrimaryKeyRelatedField(
         many=True,
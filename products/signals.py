@@ -0,0 +1,31 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import invalidate_discount, invalidate_product_ids, invalidate_products
+from .models import Category, Discount, Product, ProductImage
+from .realtime import mark_stock_changed
+
+
+@receiver([post_save, post_delete], sender=Discount)
+def discount_changed(sender, instance, **kwargs):
+    invalidate_discount(instance.code)
+
+
+# Product caches are dropped after commit so a concurrent request cannot
+# re-cache the pre-transaction row
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_products(instance.slug))
+    transaction.on_commit(lambda: mark_stock_changed([instance.pk]))
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def product_image_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_product_ids([instance.product_id]))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    slugs = list(instance.products.values_list('slug', flat=True)) if instance.pk else []
+    transaction.on_commit(lambda: invalidate_products(*slugs))
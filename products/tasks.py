@@ -0,0 +1,13 @@
+from celery import shared_task
+from .realtime import push_stock_updates
+
+@shared_task
+def push_stock_level_updates():
+    """
+    Push coalesced stock changes to WebSocket subscribers
+    """
+    try:
+        return push_stock_updates()
+    except Exception as e:
+        print(f"Error pushing stock updates: {str(e)}")
+        return 0
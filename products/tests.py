@@ -1,3 +1,281 @@
-from django.test import TestCase
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from cart.models import Cart, StockReservation
+from .cache import get_discount, get_discount_cache_key
+from .importer import CSV, JSONL, import_catalogue
+from .models import Category, Discount, Product, ProductImage
+from .serializers import ProductReadSerializer, ProductSerializer
+from .views import DiscountViewSet, ProductViewSet
 
-# Create your tests here.
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def create_catalogue(count=5):
+    """Create ``count`` products, each in its own category with two images."""
+    products = []
+    for i in range(count):
+        category = Category.objects.create(name=f'Category {i}', slug=f'category-{i}')
+        product = Product.objects.create(
+            name=f'Product {i}',
+            slug=f'product-{i}',
+            description='A product',
+            price=Decimal('9.99') + i,
+            category=category,
+            stock=10
+        )
+        ProductImage.objects.create(product=product, image=f'products/{i}-a.jpg', is_primary=True)
+        ProductImage.objects.create(product=product, image=f'products/{i}-b.jpg')
+        products.append(product)
+    return products
+
+
+def get_serializer_context():
+    return {'request': Request(APIRequestFactory().get('/'))}
+
+
+def render(data):
+    return JSONRenderer().render(data)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductQueryCountTests(TestCase):
+    """Related rows are batched, so the query count does not grow with the page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_catalogue()
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+
+    def test_list(self):
+        view = ProductViewSet.as_view({'get': 'list'})
+        # Products with their categories, then their images
+        with self.assertNumQueries(2):
+            response = view(self.factory.get('/api/products/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), len(self.products))
+
+    def test_retrieve(self):
+        view = ProductViewSet.as_view({'get': 'retrieve'})
+        with self.assertNumQueries(2):
+            response = view(self.factory.get('/api/products/product-0/'), slug='product-0')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['images']), 2)
+
+    def test_discount_list(self):
+        admin = get_user_model().objects.create_superuser(
+            email='admin@example.com', username='admin', password='password'
+        )
+        now = timezone.now()
+        for i in range(3):
+            discount = Discount.objects.create(
+                code=f'CODE{i}',
+                discount_type='percentage',
+                amount=Decimal('10.00'),
+                start_date=now - timedelta(days=1),
+                end_date=now + timedelta(days=1)
+            )
+            discount.products.set(self.products)
+            discount.categories.set(product.category for product in self.products)
+
+        view = DiscountViewSet.as_view({'get': 'list'})
+        request = self.factory.get('/api/discounts/')
+        force_authenticate(request, user=admin)
+        # Page count, discounts, then products, their categories, their
+        # images and the discount categories
+        with self.assertNumQueries(6):
+            response = view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 3)
+
+
+class ProductReadSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_catalogue()
+
+    def test_matches_model_serializer(self):
+        products = ProductSerializer.setup_eager_loading(Product.objects.order_by('pk'))
+        context = get_serializer_context()
+        self.assertEqual(
+            render(ProductReadSerializer(products, many=True, context=context).data),
+            render(ProductSerializer(products, many=True, context=context).data)
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class DiscountRedeemTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        self.discount = Discount.objects.create(
+            code='SPRING',
+            discount_type='percentage',
+            amount=Decimal('10.00'),
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=1),
+            usage_limit=2
+        )
+
+    def test_stops_at_usage_limit(self):
+        self.assertTrue(self.discount.redeem())
+        self.assertTrue(self.discount.redeem())
+        self.assertFalse(self.discount.redeem())
+        self.discount.refresh_from_db()
+        self.assertEqual(self.discount.times_used, 2)
+
+    def test_cached_discount_is_kept_until_used_up(self):
+        discount = get_discount('SPRING')
+        self.assertTrue(discount.redeem())
+        self.assertIsNotNone(cache.get(get_discount_cache_key('SPRING')))
+        self.assertTrue(discount.redeem())
+        self.assertIsNone(cache.get(get_discount_cache_key('SPRING')))
+        self.assertFalse(get_discount('SPRING').is_valid)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductSearchPaginationTests(TestCase):
+    """Search results are paged most relevant first, across pages."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_catalogue(6)
+        # Oldest first, so relevance disagrees with the default -created_at
+        cls.ranking = [product.pk for product in cls.products]
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        patcher = mock.patch('products.filters.search_product_ids', return_value=self.ranking)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, url):
+        response = ProductViewSet.as_view({'get': 'list'})(self.factory.get(url))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def get_ids(self, response):
+        return [product['id'] for product in response.data['results']]
+
+    def test_pages_follow_relevance(self):
+        response = self.get('/api/products/?search=product&page_size=4')
+        self.assertEqual(self.get_ids(response), self.ranking[:4])
+        self.assertIsNone(response.data['previous'])
+
+        response = self.get(response.data['next'])
+        self.assertEqual(self.get_ids(response), self.ranking[4:])
+        self.assertIsNone(response.data['next'])
+
+        response = self.get(response.data['previous'])
+        self.assertEqual(self.get_ids(response), self.ranking[:4])
+
+    def test_only_the_page_is_loaded(self):
+        # Matching ids, then the page's products and their images
+        with self.assertNumQueries(3):
+            response = self.get('/api/products/?search=product&page_size=2')
+        self.assertEqual(self.get_ids(response), self.ranking[:2])
+
+    def test_other_filters_apply(self):
+        response = self.get('/api/products/?search=product&max_price=12&count=true')
+        self.assertEqual(self.get_ids(response), self.ranking[:3])
+        self.assertEqual(response.data['count'], 3)
+
+    def test_explicit_ordering_wins(self):
+        response = self.get('/api/products/?search=product&ordering=-price')
+        self.assertEqual(self.get_ids(response), self.ranking[::-1])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CatalogueImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_valid_feed(self):
+        feed = (
+            'name,price,category,stock,images\n'
+            'Blue Mug,9.50,Kitchen,12,products/mug-a.jpg|products/mug-b.jpg\n'
+            'Red Mug,9.50,Kitchen,3,\n'
+            'Lamp,24.00,Living Room,0,\n'
+        )
+        admin = get_user_model().objects.create_superuser(
+            email='admin@example.com', username='admin', password='password'
+        )
+        request = APIRequestFactory().post('/api/products/import/', {
+            'file': SimpleUploadedFile('feed.csv', feed.encode(), content_type='text/csv'),
+        }, format='multipart')
+        force_authenticate(request, user=admin)
+        response = ProductViewSet.as_view({'post': 'import_catalogue'})(request)
+
+        self.assertEqual(response.status_code, 200)
+        report = response.data
+        self.assertEqual((report['processed'], report['created'], report['updated']), (3, 3, 0))
+        self.assertEqual((report['categories_created'], report['images_created']), (2, 2))
+        self.assertEqual(report['rejected'], [])
+
+        mug = Product.objects.get(slug='blue-mug')
+        self.assertEqual((mug.price, mug.stock, mug.category.name), (Decimal('9.50'), 12, 'Kitchen'))
+        self.assertEqual(
+            list(mug.images.order_by('image').values_list('image', 'is_primary')),
+            [('products/mug-a.jpg', True), ('products/mug-b.jpg', False)]
+        )
+
+        # A second run only writes what changed. The feed counts stock on
+        # hand, so what carts hold is not available
+        cart = Cart.objects.create(user=admin)
+        StockReservation.objects.create(
+            cart=cart, product=mug, quantity=5, expires_at=timezone.now() + timedelta(minutes=30)
+        )
+        report = import_catalogue(io.StringIO(feed.replace('Lamp,24.00', 'Lamp,19.00')), CSV)
+        self.assertEqual((report.created, report.updated, report.unchanged), (0, 2, 1))
+        self.assertEqual(Product.objects.get(slug='lamp').price, Decimal('19.00'))
+        mug.refresh_from_db()
+        self.assertEqual(mug.stock, 7)
+
+    def test_invalid_records_are_reported(self):
+        records = [
+            {'name': 'Desk', 'price': '120', 'category': 'Office', 'stock': 2},
+            'not json',
+            {'price': '5', 'category': 'Office'},
+            {'name': 'Chair', 'price': 'free', 'category': 'Office'},
+            {'name': 'Stool', 'price': '1.999', 'category': 'Office'},
+            {'name': 'Shelf', 'price': '40', 'category': 'Office', 'stock': -1},
+            {'name': 'Bin', 'price': '4'},
+            {'name': 'Desk', 'price': '130', 'category': 'Office'},
+            {'name': 'Lamp', 'price': '20', 'category': 'Office', 'stock': 'many'},
+            {'name': 'Pen', 'price': '1', 'category': 'Office'},
+        ]
+        feed = '\n'.join(record if isinstance(record, str) else json.dumps(record) for record in records)
+        report = import_catalogue(io.StringIO(feed), JSONL, batch_size=4)
+
+        self.assertEqual((report.processed, report.created), (10, 2))
+        self.assertEqual([rejected['record'] for rejected in report.rejected], [2, 3, 4, 5, 6, 7, 8, 9])
+        errors = [rejected['error'] for rejected in report.rejected]
+        self.assertTrue(errors[0].startswith('Invalid JSON'))
+        self.assertEqual(errors[1:], [
+            'name is required',
+            'price must be a number',
+            'price must be between 0 and 99999999.99 with at most 2 decimal places',
+            'stock cannot be negative',
+            'category is required',
+            'Duplicate slug desk (first seen in record 1)',
+            'stock must be a whole number',
+        ])
+        self.assertEqual(
+            sorted(Product.objects.values_list('slug', flat=True)),
+            ['desk', 'pen']
+        )
+        self.assertEqual(Product.objects.get(slug='desk').price, Decimal('120'))
@@ -1,13 +1,25 @@
+import codecs
 from django.shortcuts import render
-from rest_framework import viewsets, permissions, filters
+from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.core.cache import cache
 from django.conf import settings
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from ecommerce.pagination import KeysetPagination
+from ecommerce.views import SparseFieldsetMixin
 from .models import Category, Product, ProductImage, Discount
-from .serializers import CategorySerializer, ProductSerializer, DiscountSerializer
+from .serializers import (
+    CategorySerializer, ProductSerializer, ProductReadSerializer, DiscountSerializer
+)
 from .filters import ProductFilter
+from .importer import FEED_FORMATS, get_feed_format, import_catalogue
+from .cache import (
+    PRODUCT_LIST_CACHE_TIMEOUT, get_cached_product, get_catalogue_state,
+    get_product_list_cache_key, get_product_list_fingerprint, invalidate_discount
+)
 
 # Create your views here.
 
@@ -24,39 +36,75 @@ class CategoryViewSet(viewsets.ModelViewSet):
             return [permissions.IsAdminUser()]
         return [permissions.IsAuthenticatedOrReadOnly()]
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     lookup_field = 'slug'
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # Search is served by ProductFilter's text index, not SearchFilter
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = ProductFilter
-    search_fields = ['name', 'description']
     ordering_fields = ['price', 'created_at', 'name']
+    pagination_class = KeysetPagination
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'import_catalogue']:
             return [permissions.IsAdminUser()]
         return [permissions.IsAuthenticatedOrReadOnly()]
 
+    def get_serializer_class(self):
+        if self.action in ['list', 'retrieve']:
+            return ProductReadSerializer
+        return ProductSerializer
+
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = self.setup_eager_loading(super().get_queryset())
         category_slug = self.request.query_params.get('category', None)
         if category_slug:
             queryset = queryset.filter(category__slug=category_slug)
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        generation, last_modified = get_catalogue_state()
+        fingerprint = get_product_list_fingerprint(request)
+        etag = quote_etag(f'{generation}-{fingerprint}')
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
+
+        cache_key = get_product_list_cache_key(generation, fingerprint)
+        data = cache.get(cache_key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(cache_key, data, timeout=PRODUCT_LIST_CACHE_TIMEOUT)
+
+        response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def paginate_queryset(self, queryset):
+        ranking = getattr(self.request, 'search_ranking', None)
+        if ranking is None or self.request.query_params.get('ordering'):
+            return super().paginate_queryset(queryset)
+        # Search results are paged most relevant first
+        return self.paginator.paginate_ranked_queryset(queryset, ranking, self.request, view=self)
+
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        cache_key = f'product_{instance.pk}'
-        cached_data = cache.get(cache_key)
+        # The detail cache holds the full representation only
+        if self.has_sparse_fieldset():
+            return super().retrieve(request, *args, **kwargs)
+
+        # Cached by slug, so a hit skips the database entirely
+        slug = kwargs[self.lookup_url_kwarg or self.lookup_field]
 
-        if cached_data is None:
-            serializer = self.get_serializer(instance)
-            cached_data = serializer.data
-            cache.set(cache_key, cached_data, timeout=3600)  # Cache for 1 hour
+        def serialize():
+            serializer = self.get_serializer(self.get_object())
+            return serializer.data
 
-        return Response(cached_data)
+        return Response(get_cached_product(slug, serialize))
 
     @action(detail=True, methods=['post'])
     def set_primary_image(self, request, slug=None):
@@ -75,6 +123,31 @@ class ProductViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_catalogue(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'error': 'A feed file is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        feed_format = request.data.get('feed_format') or get_feed_format(upload.name)
+        if feed_format not in FEED_FORMATS:
+            return Response(
+                {'error': f'feed_format must be one of: {", ".join(FEED_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            report = import_catalogue(codecs.iterdecode(upload, 'utf-8'), feed_format)
+        except UnicodeDecodeError:
+            return Response(
+                {'error': 'Feed must be UTF-8 encoded'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(report.as_dict())
+
 class DiscountViewSet(viewsets.ModelViewSet):
     queryset = Discount.objects.all()
     serializer_class = DiscountSerializer
@@ -84,6 +157,15 @@ class DiscountViewSet(viewsets.ModelViewSet):
     search_fields = ['code', 'description']
     filterset_fields = ['is_active', 'discount_type']
 
+    def get_queryset(self):
+        return self.get_serializer_class().setup_eager_loading(super().get_queryset())
+
+    def perform_update(self, serializer):
+        # The post_save signal only sees the new code, so drop the old one too
+        old_code = serializer.instance.code
+        discount = serializer.save()
+        invalidate_discount(old_code, discount.code)
+
     @action(detail=True, methods=['get'])
     def validate(self, request, code=None):
         discount = self.get_object()